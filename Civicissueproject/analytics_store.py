@@ -0,0 +1,292 @@
+# analytics_store.py
+# Columnar (Parquet) copy of the complaints table for time-series and
+# drill-down reports.
+#
+# Layout under ANALYTICS_STORE_DIR (default: ./analytics_store):
+#
+#   month=2025-09/part-<seq>.parquet   one or more files per activity month
+#   month=unknown/...                  rows that have no updated_at yet
+#   _index.parquet                     id -> month, to find rows that moved
+#   _state.json                        sync watermark (max id / max updated_at)
+#
+# sync() only pulls rows that are new (id above the watermark) or changed
+# (updated_at above the watermark) from the analytics snapshot, as two index
+# range scans, so the cost of keeping the store current doesn't grow with the
+# table. Rows that changed are dropped from the month they used to live in
+# before the new version is appended. Complaints deleted through the app leave
+# a tombstone in deleted_complaints (same transaction); sync() drops those ids
+# too, past a third watermark on the tombstones' seq.
+#
+# Requests never sync themselves: they call sync_in_background(), which starts
+# at most one sync per SYNC_INTERVAL seconds on a background thread and
+# answers from the store as it is. Run `python analytics_store.py` once at
+# deploy time so the first dashboard has data.
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from snapshot import get_snapshot_connection
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.environ.get("ANALYTICS_STORE_DIR", os.path.join(BASE_DIR, "analytics_store"))
+
+# Columns copied into the store. Free text (complaint, landmark, names) stays in SQLite.
+COLUMNS = ["id", "district", "block", "gp", "village", "pincode", "department", "status", "updated_at"]
+CATEGORICAL = ["district", "block", "gp", "village", "pincode", "department", "status"]
+UNKNOWN_MONTH = "unknown"
+
+PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+LOCK_STALE_AFTER = 120  # seconds before a leftover sync lock is ignored
+SYNC_INTERVAL = int(os.environ.get("ANALYTICS_SYNC_INTERVAL", 60))  # seconds between background syncs
+
+_sync_lock = threading.Lock()
+_background_lock = threading.Lock()
+_background = None  # (started_at, thread) of the last background sync
+
+
+# -------------------------
+# Store bookkeeping
+# -------------------------
+def _state_path():
+    return os.path.join(STORE_DIR, "_state.json")
+
+
+def _index_path():
+    return os.path.join(STORE_DIR, "_index.parquet")
+
+
+def _read_state():
+    try:
+        with open(_state_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"max_id": 0, "max_updated_at": "", "max_deleted_seq": 0, "seq": 0}
+
+
+def _write_state(state):
+    tmp = _state_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path())
+
+
+def _read_index():
+    if not os.path.exists(_index_path()):
+        return pd.DataFrame({"id": pd.Series(dtype="int64"), "month": pd.Series(dtype="object")})
+    return pq.read_table(_index_path()).to_pandas()
+
+
+def _acquire_dir_lock():
+    """Cross-process lock: mkdir is atomic on every platform we deploy to."""
+    lock_dir = os.path.join(STORE_DIR, ".lock")
+    try:
+        os.mkdir(lock_dir)
+        return lock_dir
+    except FileExistsError:
+        if time.time() - os.path.getmtime(lock_dir) > LOCK_STALE_AFTER:
+            shutil.rmtree(lock_dir, ignore_errors=True)
+            return _acquire_dir_lock()
+        return None
+
+
+# -------------------------
+# Incremental sync
+# -------------------------
+def _to_frame(rows):
+    """Turns snapshot rows into a typed frame with a month partition column."""
+    df = pd.DataFrame([tuple(r) for r in rows], columns=COLUMNS)
+    df["id"] = df["id"].astype("int64")
+    df["updated_at"] = pd.to_datetime(df["updated_at"], errors="coerce")
+    for col in CATEGORICAL:
+        df[col] = df[col].astype("string").str.strip().astype("category")
+    df["month"] = df["updated_at"].dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+    return df
+
+
+def _drop_ids_from_month(month, ids):
+    """Rewrites one month partition without the given complaint ids."""
+    part_dir = os.path.join(STORE_DIR, f"month={month}")
+    if not os.path.isdir(part_dir):
+        return
+    table = ds.dataset(part_dir, format="parquet").to_table()
+    keep = pc.invert(pc.is_in(table["id"], value_set=pa.array(ids, pa.int64())))
+    table = table.filter(keep)
+    tmp_dir = part_dir + ".rewrite"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    if table.num_rows:
+        pq.write_table(table, os.path.join(tmp_dir, "part-0.parquet"))
+    shutil.rmtree(part_dir)
+    os.replace(tmp_dir, part_dir)
+
+
+def sync():
+    """Applies new, changed and deleted complaints to the store. Returns rows written or dropped."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with _sync_lock:
+        lock_dir = _acquire_dir_lock()
+        if lock_dir is None:
+            return 0  # another worker is syncing; readers use what is there
+        try:
+            return _sync_locked()
+        finally:
+            shutil.rmtree(lock_dir, ignore_errors=True)
+
+
+def _sync_locked():
+    state = _read_state()
+    conn = get_snapshot_connection()
+    # A UNION of two indexed ranges; "id > ? OR updated_at > ?" would scan the table
+    cols = ", ".join(COLUMNS)
+    rows = conn.execute(
+        f"SELECT {cols} FROM complaints WHERE id > ? UNION SELECT {cols} FROM complaints WHERE updated_at > ?",
+        (state["max_id"], state["max_updated_at"]),
+    ).fetchall()
+    try:
+        deleted = conn.execute("SELECT seq, complaint_id FROM deleted_complaints WHERE seq > ?",
+                               (state.get("max_deleted_seq", 0),)).fetchall()
+    except sqlite3.OperationalError:
+        deleted = []  # snapshot taken before the tombstone table existed
+    conn.close()
+    if not rows and not deleted:
+        return 0
+
+    df = _to_frame(rows)
+    index = _read_index()
+
+    # Changed and deleted rows: drop the old copy from whatever month it was in
+    gone = set(df["id"]) | {row[1] for row in deleted}
+    moved = index[index["id"].isin(gone)]
+    for month, group in moved.groupby("month"):
+        _drop_ids_from_month(month, group["id"].tolist())
+    index = index[~index["id"].isin(gone)]
+    if deleted:
+        state["max_deleted_seq"] = max(state.get("max_deleted_seq", 0), max(row[0] for row in deleted))
+
+    state["seq"] += 1
+    for month, part in df.groupby("month"):
+        part_dir = os.path.join(STORE_DIR, f"month={month}")
+        os.makedirs(part_dir, exist_ok=True)
+        table = pa.Table.from_pandas(part.drop(columns=["month"]), preserve_index=False)
+        pq.write_table(table, os.path.join(part_dir, f"part-{state['seq']}.parquet"))
+
+    index = pd.concat([index, df[["id", "month"]]], ignore_index=True)
+    pq.write_table(pa.Table.from_pandas(index, preserve_index=False), _index_path())
+
+    if not df.empty:
+        state["max_id"] = max(state["max_id"], int(df["id"].max()))
+        latest = df["updated_at"].max()
+        if pd.notna(latest):
+            state["max_updated_at"] = max(state["max_updated_at"], latest.isoformat())
+    _write_state(state)
+    return len(df) + len(deleted)
+
+
+def sync_in_background():
+    """Starts sync() on a background thread unless one ran in the last SYNC_INTERVAL seconds."""
+    global _background
+    with _background_lock:
+        if _background is not None and (_background[1].is_alive()
+                                        or time.monotonic() - _background[0] < SYNC_INTERVAL):
+            return False
+        thread = threading.Thread(target=_sync_quietly, name="analytics-sync", daemon=True)
+        _background = (time.monotonic(), thread)
+        thread.start()
+    return True
+
+
+def _sync_quietly():
+    try:
+        sync()
+    except Exception as e:  # readers keep the store as it was
+        print(f"⚠️ Analytics store sync failed: {e}")
+
+
+def rebuild():
+    """Drops the store and re-imports every complaint."""
+    shutil.rmtree(STORE_DIR, ignore_errors=True)
+    return sync()
+
+
+def compact():
+    """Merges each month's part files into one file."""
+    for name in os.listdir(STORE_DIR) if os.path.isdir(STORE_DIR) else []:
+        if name.startswith("month="):
+            _drop_ids_from_month(name.split("=", 1)[1], [])
+
+
+# -------------------------
+# Query API
+# -------------------------
+def load(columns, months=None, filter=None):
+    """Reads only `columns` (and only `months` partitions) into a DataFrame."""
+    if not os.path.isdir(STORE_DIR) or not any(n.startswith("month=") for n in os.listdir(STORE_DIR)):
+        return pd.DataFrame(columns=columns)
+    dataset = ds.dataset(STORE_DIR, format="parquet", partitioning=PARTITIONING,
+                         exclude_invalid_files=True, ignore_prefixes=["_", "."])
+    expr = filter
+    if months:
+        month_expr = ds.field("month").isin(list(months))
+        expr = month_expr if expr is None else expr & month_expr
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def _equals(**filters):
+    expr = None
+    for col, value in filters.items():
+        if value is None:
+            continue
+        cond = ds.field(col) == value
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def time_series(freq="D", months=None, department=None, district=None):
+    """Complaint counts per time bucket (D/W/M) by last activity date."""
+    df = load(["updated_at"], months, _equals(department=department, district=district))
+    df = df.dropna(subset=["updated_at"])
+    if df.empty:
+        return pd.Series(dtype="int64")
+    return df.groupby(df["updated_at"].dt.to_period(freq)).size()
+
+
+DRILL_LEVELS = ["district", "block", "gp", "village"]
+
+
+def drilldown(district=None, block=None, gp=None, months=None):
+    """Counts per status one level below the given location (district → block → GP → village)."""
+    path = {"district": district, "block": block, "gp": gp}
+    depth = next((i for i, lvl in enumerate(DRILL_LEVELS[:-1]) if path[lvl] is None), 3)
+    level = DRILL_LEVELS[depth]
+    df = load([level, "status"], months, _equals(**path))
+    if df.empty:
+        return pd.DataFrame()
+    return (df.groupby([level, "status"], observed=True).size()
+              .unstack(fill_value=0))
+
+
+def department_trend(months=None, freq="M"):
+    """Department × time-bucket complaint counts."""
+    df = load(["department", "updated_at"], months).dropna(subset=["updated_at"])
+    if df.empty:
+        return pd.DataFrame()
+    return (df.groupby([df["updated_at"].dt.to_period(freq), "department"], observed=True).size()
+              .unstack(fill_value=0))
+
+
+if __name__ == "__main__":
+    import sys
+    if "--rebuild" in sys.argv:
+        print("Rebuilding analytics store in", STORE_DIR)
+        print(f"✅ {rebuild()} rows written")
+    else:
+        print(f"✅ {sync()} new/changed rows synced to {STORE_DIR}")
@@ -0,0 +1,267 @@
+# api_v1.py
+# Versioned, read-only JSON API for the mobile app.
+#
+#   GET /api/v1/complaints            the caller's complaints, newest first
+#   GET /api/v1/complaints/<id>       one complaint (owner or admin)
+#   GET /api/v1/feedback              community feedback, newest first
+#   GET /api/v1/stats                 complaint counts by status / department
+#
+# ?fields=id,status,... picks the columns; only those are SELECTed. Lists take
+# ?limit= and ?cursor= (the next_cursor of the previous page) and page on the
+# primary key, so deep pages cost the same as the first.
+#
+# Every response carries an ETag built from a version number, not from the
+# rows. Triggers on complaints and feedback bump a counter in row_versions
+# for the affected user / complaint / the feedback wall on every write, from
+# any code path. A poll with a matching If-None-Match reads that one counter
+# and gets 304 without the rows being read.
+import hmac
+
+from flask import Blueprint, current_app, jsonify, make_response, request, session, url_for
+
+from archive import complaints_source
+from compression import etag_matches
+from database import get_db_connection
+from snapshot import ensure_fresh, get_snapshot_connection, snapshot_taken_at
+
+api_v1_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+# --- Config ---
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+COMPLAINT_FIELDS = ("id", "status", "department", "complaint", "name", "phone", "district", "block", "gp",
+                    "village", "landmark", "pincode", "updated_at", "proof", "voice_proof", "admin_proof",
+                    "duplicate_of", "latitude", "longitude")
+COMPLAINT_LIST_DEFAULT = ("id", "status", "department", "district", "updated_at")
+FEEDBACK_FIELDS = ("id", "name", "type", "rating", "message", "created_at")  # never the email
+MEDIA_ENDPOINTS = {"proof": "uploads.media", "voice_proof": "uploads.media", "admin_proof": "admin_proofs"}
+
+
+def create_tables(conn):
+    """row_versions and the triggers that keep it current."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS row_versions (
+                        scope TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID""")
+    bump = "ON CONFLICT(scope) DO UPDATE SET version = version + 1"
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS row_versions_complaints_{event.lower()}
+                         AFTER {event} ON complaints BEGIN
+                             INSERT INTO row_versions (scope, version)
+                             VALUES ('user:' || {row}.user_phone, 1), ('complaint:' || {row}.id, 1) {bump};
+                         END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS row_versions_feedback_{event.lower()}
+                         AFTER {event} ON feedback BEGIN
+                             INSERT INTO row_versions (scope, version) VALUES ('feedback', 1) {bump};
+                         END""")
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _error(message, status):
+    return jsonify({"success": False, "error": message}), status
+
+
+def _version(conn, scope):
+    row = conn.execute("SELECT version FROM row_versions WHERE scope = ?", (scope,)).fetchone()
+    return row[0] if row else 0
+
+
+def _etag(scope, version):
+    # The query string is part of the representation (fields, cursor, filters).
+    # Keyed, so nobody can forge a tag for someone else's complaint and probe it for 304s.
+    message = f"{scope}?{request.query_string.decode()}".encode()
+    digest = hmac.new(current_app.secret_key.encode(), message, "sha256").hexdigest()[:16]
+    return f"{version}.{digest}"
+
+
+def _not_modified(etag):
+    """304 response if the client already has `etag`, else None."""
+    tag = etag_matches(etag)
+    if tag is None:
+        return None
+    response = make_response("", 304)
+    response.set_etag(tag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _respond(payload, etag, private=True):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # always revalidate; cheap thanks to the ETag
+    if private:
+        response.cache_control.private = True
+    response.vary.add("Cookie")
+    return response
+
+
+def _fields(allowed, default):
+    """Columns requested with ?fields=, or (None, error response)."""
+    raw = request.args.get("fields")
+    if not raw:
+        return list(default), None
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, _error(f"Unknown field(s): {', '.join(unknown)}", 400)
+    if "id" not in fields:
+        fields.insert(0, "id")  # needed for the cursor
+    return fields, None
+
+
+def _page_args():
+    """(limit, cursor) from the query string, or raises ValueError."""
+    limit = min(max(int(request.args.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    cursor = request.args.get("cursor")
+    return limit, int(cursor) if cursor else None
+
+
+def _row_dict(row, fields):
+    item = {field: row[field] for field in fields}
+    for field, endpoint in MEDIA_ENDPOINTS.items():
+        if field in item:
+            item[f"{field}_url"] = url_for(endpoint, filename=item[field]) if item[field] else None
+    return item
+
+
+def _page(conn, source, fields, where, params, limit, cursor):
+    if cursor is not None:
+        where, params = where + ["id < ?"], params + [cursor]
+    sql = f"SELECT {', '.join(fields)} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    rows = conn.execute(f"{sql} ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+    next_cursor = str(rows[limit - 1]["id"]) if len(rows) > limit else None
+    return [_row_dict(r, fields) for r in rows[:limit]], next_cursor
+
+
+# -------------------------
+# Routes
+# -------------------------
+@api_v1_bp.route("/complaints")
+def complaints():
+    """The caller's complaints (?fields=, ?status=, ?limit=, ?cursor=, ?archive=1)."""
+    if session.get("role") != "user":
+        return _error("Authentication required", 401)
+    fields, error = _fields(COMPLAINT_FIELDS, COMPLAINT_LIST_DEFAULT)
+    if error:
+        return error
+    try:
+        limit, cursor = _page_args()
+    except ValueError:
+        return _error("Invalid limit or cursor", 400)
+
+    conn = get_db_connection()
+    try:
+        etag = _etag(f"user:{session['user']}", _version(conn, f"user:{session['user']}"))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        where, params = ["user_phone = ?"], [session["user"]]
+        if request.args.get("status"):
+            where.append("status = ?")
+            params.append(request.args["status"])
+        source = complaints_source(conn, request.args.get("archive") == "1")
+        items, next_cursor = _page(conn, source, fields, where, params, limit, cursor)
+    finally:
+        conn.close()
+    return _respond({"success": True, "data": items, "next_cursor": next_cursor}, etag)
+
+
+@api_v1_bp.route("/complaints/<int:cid>")
+def complaint_detail(cid):
+    """One complaint (?fields=); archived complaints are found too."""
+    if session.get("role") not in ("user", "admin"):
+        return _error("Authentication required", 401)
+    fields, error = _fields(COMPLAINT_FIELDS, COMPLAINT_FIELDS)
+    if error:
+        return error
+
+    conn = get_db_connection()
+    try:
+        etag = _etag(f"complaint:{cid}:{session.get('role')}:{session.get('user')}",
+                     _version(conn, f"complaint:{cid}"))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        columns = ", ".join(dict.fromkeys(fields + ["user_phone"]))
+        row = conn.execute(f"SELECT {columns} FROM complaints WHERE id = ?", (cid,)).fetchone()
+        if row is None:
+            row = conn.execute(f"SELECT {columns} FROM {complaints_source(conn, True)} WHERE id = ?",
+                               (cid,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return _error("Complaint not found", 404)
+    if session.get("role") != "admin" and row["user_phone"] != session.get("user"):
+        return _error("Forbidden", 403)
+    return _respond({"success": True, "data": _row_dict(row, fields)}, etag)
+
+
+@api_v1_bp.route("/feedback")
+def feedback():
+    """Community feedback (?fields=, ?type=, ?min_rating=, ?limit=, ?cursor=)."""
+    fields, error = _fields(FEEDBACK_FIELDS, FEEDBACK_FIELDS)
+    if error:
+        return error
+    min_rating = request.args.get("min_rating", type=int)
+    try:
+        limit, cursor = _page_args()
+    except ValueError:
+        return _error("Invalid limit or cursor", 400)
+
+    conn = get_db_connection()
+    try:
+        etag = _etag("feedback", _version(conn, "feedback"))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        where, params = [], []
+        if request.args.get("type"):
+            where.append("type = ?")
+            params.append(request.args["type"])
+        if min_rating is not None:
+            where.append("rating >= ?")
+            params.append(min_rating)
+        items, next_cursor = _page(conn, "feedback", fields, where, params, limit, cursor)
+    finally:
+        conn.close()
+    return _respond({"success": True, "data": items, "next_cursor": next_cursor}, etag, private=False)
+
+
+@api_v1_bp.route("/stats")
+def stats():
+    """Counts by status and department: the caller's own, or (admins) city-wide from the snapshot."""
+    role = session.get("role")
+    if role not in ("user", "admin"):
+        return _error("Authentication required", 401)
+
+    if role == "admin":
+        ensure_fresh()
+        etag = _etag("stats", snapshot_taken_at())
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        conn = get_snapshot_connection()
+        where, params = "", []
+    else:
+        conn = get_db_connection()
+        etag = _etag(f"user:{session['user']}", _version(conn, f"user:{session['user']}"))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            conn.close()
+            return not_modified
+        where, params = "WHERE user_phone = ?", [session["user"]]
+    try:
+        by_status = dict(conn.execute(
+            f"SELECT COALESCE(status, 'Pending'), COUNT(*) FROM complaints {where} GROUP BY 1", params).fetchall())
+        by_department = dict(conn.execute(
+            f"SELECT COALESCE(department, 'Other'), COUNT(*) FROM complaints {where} GROUP BY 1", params).fetchall())
+    finally:
+        conn.close()
+    payload = {"success": True, "total": sum(by_status.values()), "by_status": by_status,
+               "by_department": by_department}
+    if role == "admin":
+        payload["data_as_of"] = snapshot_taken_at()
+    return _respond(payload, etag)
@@ -1,27 +1,35 @@
 # app.py (FINAL, CORRECTED, AND INTEGRATED)
 import os
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 
-import matplotlib
-import pandas as pd
 from flask import (Flask, flash, redirect, render_template, request,
-                   send_from_directory, session, url_for, jsonify) # <-- IMPORT jsonify
+                   session, url_for, jsonify) # <-- IMPORT jsonify
 from werkzeug.utils import secure_filename
 
-# Use non-interactive backend for servers
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-
 # --- 1. Import your new modular Blueprints ---
 from chatbot import chat_bp
 from uploads import upload_bp
 from features import api_bp, admin_features_bp
+from api_v1 import api_v1_bp, create_tables as create_api_tables
 
 # --- 2. Import the database functions from database.py ---
+import complaint_cache
+from archive import archive_in_background, complaints_source
+from community import (create_tables as create_community_tables, invalidate as invalidate_community,
+                       page as community_page)
 from database import (get_all_complaints, get_complaint_by_id, get_db_connection,
-                      get_db_df, get_user_complaints, update_complaint_status)
-from piu import generate_odisha_heatmap
+                      get_db_df, get_duplicates, get_user_complaints, record_status_change,
+                      update_complaint_status)
+from hotspots import create_tables as create_hotspot_tables, on_delete as hotspot_on_delete
+from resolution_stats import create_tables as create_resolution_tables, quantiles
+import triage
+import write_queue
+from compression import init_app as init_compression
+from ratelimit import init_app as init_ratelimit
+from delivery import send_media
+from snapshot import snapshot_taken_at
 
 # ==================== APP SETUP ====================
 app = Flask(__name__)
@@ -39,6 +47,10 @@ for d in (UPLOAD_FOLDER, ADMIN_PROOF_FOLDER, CHART_FOLDER):
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["ADMIN_PROOF_FOLDER"] = ADMIN_PROOF_FOLDER
 app.config["CHART_FOLDER"] = CHART_FOLDER
+# Single-request (multipart) uploads; bigger files go through the resumable uploader
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_FORM_UPLOAD_BYTES", 50 * 1024 * 1024))
+# "client": browser draws charts from /admin/charts/data.json; "server": matplotlib PNGs
+app.config["DASHBOARD_CHART_MODE"] = os.environ.get("DASHBOARD_CHART_MODE", "client")
 
 
 # --- Database Initializer ---
@@ -64,12 +76,62 @@ def init_db():
                      email TEXT NOT NULL, type TEXT NOT NULL, rating INTEGER NOT NULL,
                      message TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP
                  )''')
+    # Columns added after the first release
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(complaints)")}
+    for column, decl in (("voice_proof", "TEXT"), ("duplicate_of", "INTEGER"),
+                         ("latitude", "REAL"), ("longitude", "REAL"),
+                         ("geo_state", "TEXT"), ("geo_district", "TEXT")):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE complaints ADD COLUMN {column} {decl}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_complaints_duplicate_of ON complaints (duplicate_of)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_complaints_user_phone ON complaints (user_phone)")
+    # Incremental analytics sync (analytics_store.py) reads changed rows by updated_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_complaints_updated_at ON complaints (updated_at)")
+    # ...and drops deleted ones by seq, which grows in commit order
+    conn.execute("""CREATE TABLE IF NOT EXISTS deleted_complaints (
+                     seq INTEGER PRIMARY KEY AUTOINCREMENT, complaint_id INTEGER NOT NULL, deleted_at TEXT NOT NULL
+                 )""")
+    # Status history + resolution-time sketches
+    create_resolution_tables(conn)
+    create_hotspot_tables(conn)
+    # Version counters behind the /api/v1 ETags
+    create_api_tables(conn)
+    triage.create_tables(conn)
+    # Indexes behind the /community filters
+    create_community_tables(conn)
     conn.commit()
     conn.close()
 
 init_db()
 
 
+# --- Duplicate index warm-up ---
+_duplicates_warmed_in = None  # pid of the worker that started it
+
+
+@app.before_request
+def warm_duplicate_index():
+    """On a worker's first request, builds its duplicate index on a background thread."""
+    global _duplicates_warmed_in
+    if _duplicates_warmed_in != os.getpid():
+        _duplicates_warmed_in = os.getpid()
+        threading.Thread(target=_warm_duplicates, name="duplicates-warm", daemon=True).start()
+
+
+def _warm_duplicates():
+    try:
+        import duplicates  # numpy: kept off worker boot
+        duplicates.warm()
+    except Exception as e:  # the first lookup builds it instead
+        print(f"⚠️ Duplicate index warm-up failed: {e}")
+
+
+# --- Scheduled archiving (archive.py) ---
+@app.before_request
+def schedule_archive():
+    archive_in_background()  # a stamp-file check at most once a minute
+
+
 # --- Jinja Filter ---
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format="%d %b %Y"):
@@ -90,77 +152,10 @@ def datetimeformat(value, format="%d %b %Y"):
 
 # -------------------- CHART GENERATION --------------------
 def generate_charts():
-    df = get_db_df()
-    if df.empty:
-        return {}
-
-    chart_paths = {}
-
-    # Complaints by Status
-    status_counts = df['status'].fillna('Pending').value_counts()
-    status_counts.plot(kind='bar', edgecolor='black', color='#0a66ff')
-    plt.title('Complaints by Status')
-    plt.tight_layout()
-    path = os.path.join(CHART_FOLDER, 'status_bar.png')
-    plt.savefig(path); plt.close()
-    chart_paths['status'] = 'admin_charts/status_bar.png'
-
-    # Complaints by Department
-    dept_counts = df['department'].fillna('Unknown').value_counts()
-    dept_counts.plot(kind='pie', autopct='%1.1f%%')
-    plt.ylabel('')
-    plt.title('Complaints by Department')
-    plt.tight_layout()
-    path = os.path.join(CHART_FOLDER, 'department_pie.png')
-    plt.savefig(path); plt.close()
-    chart_paths['department'] = 'admin_charts/department_pie.png'
-
-    # Top Pincodes
-    pincode_counts = df['pincode'].fillna('Unknown').value_counts().head(10)
-    pincode_counts.plot(kind='bar', edgecolor='black', color='#28a745')
-    plt.title('Top 10 Pincodes by Complaints')
-    plt.xlabel('Pincode'); plt.ylabel('Complaints')
-    plt.tight_layout()
-    path = os.path.join(CHART_FOLDER, 'pincode_bar.png')
-    plt.savefig(path); plt.close()
-    chart_paths['pincode'] = 'admin_charts/pincode_bar.png'
-
-    # Complaints Over Time
-    if 'updated_at' in df.columns:
-        df['updated_at'] = pd.to_datetime(df['updated_at'], errors='coerce')
-        time_counts = df.dropna(subset=['updated_at']).groupby(df['updated_at'].dt.date).size()
-        if not time_counts.empty:
-            time_counts.plot(kind='line', marker='o')
-            plt.title('Complaints Over Time')
-            plt.xlabel('Date'); plt.ylabel('Count')
-            plt.tight_layout()
-            path = os.path.join(CHART_FOLDER, 'time_line.png')
-            plt.savefig(path); plt.close()
-            chart_paths['time'] = 'admin_charts/time_line.png'
-
-    # Complaints by District
-    district_counts = df['district'].fillna('Unknown').value_counts().head(10)
-    district_counts.plot(kind='bar', edgecolor='black', color='#ffc107')
-    plt.title('Complaints by District (Top 10)')
-    plt.xlabel('District'); plt.ylabel('Complaints')
-    plt.tight_layout()
-    path = os.path.join(CHART_FOLDER, 'district_bar.png')
-    plt.savefig(path); plt.close()
-    chart_paths['district'] = 'admin_charts/district_bar.png'
-
-    # Dept vs Status
-    dept_status = df.pivot_table(index='department', columns='status',
-                                 aggfunc='size', fill_value=0)
-    if not dept_status.empty:
-        dept_status.plot(kind='bar', stacked=True)
-        plt.title('Department vs Status')
-        plt.xlabel('Department'); plt.ylabel('Complaints')
-        plt.tight_layout()
-        path = os.path.join(CHART_FOLDER, 'dept_status.png')
-        plt.savefig(path); plt.close()
-        chart_paths['dept_status'] = 'admin_charts/dept_status.png'
-
-    return chart_paths
+    # Deferred import: pandas + matplotlib load on the first dashboard hit,
+    # not on every worker boot.
+    from charts import generate_charts as render_charts
+    return render_charts(CHART_FOLDER)
 
 # -------------------- ROUTES --------------------
 @app.route("/")
@@ -273,18 +268,41 @@ def submit_complaint():
         voice_file.save(os.path.join(app.config["UPLOAD_FOLDER"], voice_filename))
     # --- END NEW ---
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    # --- UPDATED: Add voice_proof to INSERT query ---
-    c.execute('''INSERT INTO complaints 
-                  (user_phone, name, phone, district, block, gp, village, landmark, pincode, department, complaint, proof, voice_proof) 
-                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (session["user"], name, phone, district, block, gp, village, landmark, pincode, department, complaint, proof_filename, voice_filename))
-    # --- END UPDATE ---
-    conn.commit()
-    conn.close()
-
-    flash("Complaint submitted successfully!", "success")
+    # Optional GPS position, resolved to a district against the GADM polygons
+    latitude = longitude = geo_state = geo_district = None
+    if request.form.get("latitude") and request.form.get("longitude"):
+        from geocoder import resolve_location  # shapely/geopandas load on first use
+        latitude, longitude, geo_state, geo_district = resolve_location(
+            request.form["latitude"], request.form["longitude"])
+
+    # Link near-duplicates of an open complaint to the original ticket
+    import duplicates  # numpy is only loaded once someone actually submits
+    duplicate_of = duplicates.find_duplicate(district, village, department, complaint)
+
+    user_phone = session["user"]  # insert() runs on the writer thread, outside the request
+
+    def insert(conn):
+        c = conn.execute('''INSERT INTO complaints 
+                      (user_phone, name, phone, district, block, gp, village, landmark, pincode, department, complaint, proof, voice_proof, duplicate_of,
+                       latitude, longitude, geo_state, geo_district) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (user_phone, name, phone, district, block, gp, village, landmark, pincode, department, complaint, proof_filename, voice_filename, duplicate_of,
+                   latitude, longitude, geo_state, geo_district))
+        record_status_change(conn, c.lastrowid, None, "Pending")
+        return c.lastrowid
+
+    # Committed together with other submissions arriving at the same moment
+    cid = write_queue.submit(insert)
+    triage.enqueue(cid, complaint)  # suggested department, scored in the background
+
+    if duplicate_of:
+        flash(f"Complaint submitted! It looks like ticket #{duplicate_of}, so we've linked it there.", "info")
+    else:
+        duplicates.index_complaint(cid, district, village, department, complaint)
+        flash("Complaint submitted successfully!", "success")
+    # The report page submits via fetch and then uploads large media resumably
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"success": True, "complaint_id": cid, "redirect": url_for("mycomplaints")})
     return redirect(url_for("mycomplaints"))
 
 # ======================= NEW DELETE ROUTE =======================
@@ -312,14 +330,33 @@ def delete_complaint(cid):
         return jsonify({"success": False, "error": "Only pending complaints can be deleted."}), 400
 
     # 4. Deletion: If all checks pass, delete the complaint
+    import duplicates
+    hotspot_on_delete(conn, cid)
+    relinked = duplicates.on_delete(conn, cid)  # its duplicates get a new original
     conn.execute("DELETE FROM complaints WHERE id = ?", (cid,))
+    conn.execute("DELETE FROM status_history WHERE complaint_id = ?", (cid,))
+    conn.execute("DELETE FROM triage_suggestions WHERE complaint_id = ?", (cid,))
+    conn.execute("INSERT INTO deleted_complaints (complaint_id, deleted_at) VALUES (?, ?)",
+                 (cid, datetime.utcnow().isoformat()))  # tombstone for the analytics store
     conn.commit()
     conn.close()
+    complaint_cache.invalidate(cid, *relinked)
+
+    duplicates.forget(cid)
 
     return jsonify({"success": True, "message": "Complaint deleted successfully."}), 200
 # ===================== END NEW DELETE ROUTE =====================
 
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"success": False, "error": "File too large"}), 413
+    flash("That file is too large to send in one go. Submit the complaint first, then upload it "
+          "from the proof page.", "danger")
+    return redirect(request.referrer or url_for("home"))
+
+
 # -------------------- FEEDBACK --------------------
 @app.route("/submit_feedback", methods=["POST"])
 def submit_feedback():
@@ -333,13 +370,13 @@ def submit_feedback():
         flash("All fields are required.", "danger")
         return redirect(url_for("mycomplaints"))
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''INSERT INTO feedback (name, email, type, rating, message)
-                 VALUES (?, ?, ?, ?, ?)''',
-              (name, email, ftype, rating, message))
-    conn.commit()
-    conn.close()
+    def insert(conn):
+        return conn.execute('''INSERT INTO feedback (name, email, type, rating, message)
+                               VALUES (?, ?, ?, ?, ?)''',
+                            (name, email, ftype, rating, message)).lastrowid
+
+    write_queue.submit(insert)
+    invalidate_community()
 
     flash("Thank you for your feedback!", "success")
     return redirect(url_for("mycomplaints"))
@@ -359,31 +396,41 @@ def admin_required(fn):
 @admin_required
 def admin_dashboard():
     q = request.args.get("q", "").strip()
+    # ?archive=1 also lists/searches complaints moved to the archive (archive.py)
+    include_archive = request.args.get("archive") == "1"
+    # ?charts=server forces the PNG view (printing, browsers without JS)
+    chart_mode = request.args.get("charts")
+    if chart_mode not in ("client", "server"):
+        chart_mode = app.config["DASHBOARD_CHART_MODE"]
+
+    from piu import generate_odisha_heatmap  # geopandas/folium are loaded on demand
 
-    charts = generate_charts()
+    charts = generate_charts() if chart_mode == "server" else {}
     charts['odisha_map'] = generate_odisha_heatmap()
     df = get_db_df()
+    data_as_of = snapshot_taken_at()
     total = len(df)
     by_status = df['status'].fillna('Pending').value_counts().to_dict()
     by_dept = df['department'].fillna('Unknown').value_counts().to_dict()
 
     conn = get_db_connection()
     c = conn.cursor()
+    source = complaints_source(conn, include_archive)
 
     if q:
         like_q = f"%{q}%"
-        c.execute("""SELECT id, user_phone, name, phone, district, block, gp, village, landmark, pincode,
-                             department, complaint, proof, status, admin_proof, updated_at
-                       FROM complaints
+        c.execute(f"""SELECT id, user_phone, name, phone, district, block, gp, village, landmark, pincode,
+                             department, complaint, proof, status, admin_proof, updated_at, duplicate_of
+                       FROM {source}
                        WHERE user_phone LIKE ? OR phone LIKE ? OR department LIKE ? 
                              OR pincode LIKE ? OR district LIKE ? OR village LIKE ?
                              OR complaint LIKE ?
                        ORDER BY id DESC""",
                   (like_q, like_q, like_q, like_q, like_q, like_q, like_q))
     else:
-        c.execute("""SELECT id, user_phone, name, phone, district, block, gp, village, landmark, pincode,
-                             department, complaint, proof, status, admin_proof, updated_at
-                       FROM complaints ORDER BY id DESC""")
+        c.execute(f"""SELECT id, user_phone, name, phone, district, block, gp, village, landmark, pincode,
+                             department, complaint, proof, status, admin_proof, updated_at, duplicate_of
+                       FROM {source} ORDER BY id DESC""")
 
     complaints = c.fetchall()
 
@@ -399,6 +446,10 @@ def admin_dashboard():
                        AND datetime(updated_at) <= ?""", (five_days_ago.isoformat(),))
     alerts = c.fetchall()
 
+    # Resolution times (p50/p90 hours) straight from the sketches
+    resolution_by_dept = quantiles(conn, "department")
+    resolution_by_district = quantiles(conn, "district")
+
     conn.close()
 
     return render_template("admin_dashboard.html",
@@ -406,7 +457,13 @@ def admin_dashboard():
                            by_status=by_status, by_dept=by_dept,
                            complaints=complaints,
                            feedbacks=feedbacks,
-                           alerts=alerts)  # 👈 new variable
+                           alerts=alerts,  # 👈 new variable
+                           data_as_of=data_as_of,
+                           chart_mode=chart_mode,
+                           include_archive=include_archive,
+                           q=q,
+                           resolution_by_dept=resolution_by_dept,
+                           resolution_by_district=resolution_by_district)
 
 
 
@@ -428,6 +485,9 @@ def admin_update_status_route():
         return redirect(request.referrer or url_for("admin_dashboard"))
 
     update_complaint_status(cid, new_status, admin_proof_filename)
+    import duplicates
+    if (new_status or "").strip().lower() in duplicates.CLOSED_STATUSES:
+        duplicates.forget(int(cid))
     flash("Complaint status updated.", "success")
     return redirect(request.referrer or url_for("admin_dashboard"))
 
@@ -435,12 +495,12 @@ def admin_update_status_route():
 @app.route('/admin_charts/<path:filename>')
 @admin_required
 def admin_charts(filename):
-    return send_from_directory(CHART_FOLDER, filename)
+    return send_media("admin_charts", CHART_FOLDER, filename)
 
 @app.route('/admin_proofs/<path:filename>')
 # @admin_required
 def admin_proofs(filename):
-    return send_from_directory(ADMIN_PROOF_FOLDER, filename)
+    return send_media("admin_proofs", ADMIN_PROOF_FOLDER, filename)
 
 # -------------------- NEW ADMIN ROUTES --------------------
 @app.route("/admin/user/<user_phone>")
@@ -452,74 +512,43 @@ def admin_user_view(user_phone):
 @app.route("/admin/complaint/<int:cid>")
 @admin_required
 def admin_complaint_view(cid):
-    complaint = get_complaint_by_id(cid)
+    complaint = get_complaint_by_id(cid, include_archive=True)
     if not complaint:
         flash("Complaint not found", "danger")
         return redirect(url_for("admin_dashboard"))
-    return render_template("admin_complaint_view.html", complaint=complaint)
+    return render_template("admin_complaint_view.html", complaint=complaint,
+                           duplicates=get_duplicates(cid), suggestion=triage.get_suggestion(cid),
+                           suggest_min_confidence=triage.SUGGEST_MIN_CONFIDENCE)
 
 # -------------------- USER --------------------
 @app.route("/mycomplaints")
 def mycomplaints():
     if session.get("role") == "user":
-        user_phone = session.get("user")
-        # Use the get_db_connection to ensure you can access columns by name
-        conn = get_db_connection() 
-        # The query now uses SELECT * to get ALL columns, including voice_proof
-        complaints = conn.execute("SELECT * FROM complaints WHERE user_phone = ? ORDER BY id DESC", (user_phone,)).fetchall()
-        conn.close()
+        # Archived (long-resolved) tickets stay visible to their owner
+        complaints = get_user_complaints(session.get("user"))
         return render_template("mycomplaints.html", complaints=complaints)
     return redirect(url_for("home"))
 
 @app.route("/community")
 def community():
-    department = request.args.get("department", "all")
-    rating = request.args.get("rating", "all")
-    sort = request.args.get("sort", "newest")
-
-    query = "SELECT id, name, email, type, rating, message, created_at FROM feedback WHERE 1=1"
-    params = []
-
-    # Department filter
-    if department != "all":
-        query += " AND type = ?"
-        params.append(department)
-
-    # Rating filter
-    if rating != "all":
-        query += " AND rating >= ?"
-        params.append(int(rating))
-
-    # Sorting
-    if sort == "newest":
-        query += " ORDER BY id DESC"
-    elif sort == "oldest":
-        query += " ORDER BY id ASC"
-    elif sort == "highest":
-        query += " ORDER BY rating DESC"
-    elif sort == "lowest":
-        query += " ORDER BY rating ASC"
-
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(query, params)
-    feedbacks = c.fetchall()
-    conn.close()
-
-    return render_template("community.html",
-                           feedbacks=feedbacks,
-                           selected_department=department,
-                           selected_rating=rating,
-                           selected_sort=sort)
+    # Rendered pages are cached per filter combination (see community.py)
+    return community_page(request.args.get("department"), request.args.get("rating"),
+                          request.args.get("sort"))
 
 
 # ==================== BLUEPRINT REGISTRATION ====================
 # --- 3. Register your new blueprints alongside the old ones ---
 app.register_blueprint(api_bp)
+app.register_blueprint(api_v1_bp)
 app.register_blueprint(admin_features_bp)
 app.register_blueprint(chat_bp)
 app.register_blueprint(upload_bp)
 
+# gzip/brotli for dynamic responses, precompressed siblings for static files
+init_compression(app)
+# 429s for callers over their rate limit and when the expensive admin pages are saturated
+init_ratelimit(app)
+
 # ==================== MAIN EXECUTION ====================
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,198 @@
+# archive.py
+# Hot/cold split of the complaints table.
+#
+# Resolved complaints whose last update is older than ARCHIVE_AFTER_DAYS are
+# moved, together with their status_history rows, into civic_archive.db next
+# to the live database. The live table then only grows with open and recently
+# resolved tickets, which is what the admin listing, search and reports scan.
+#
+# Archived rows keep their ids and their proof / admin_proof / voice_proof
+# file names; the files themselves stay where they are, so links keep working.
+# complaints uses AUTOINCREMENT, so an archived id is never handed out again.
+# Reads that should see the archive attach it and query complaints_source().
+# Triage suggestions only matter for open tickets and are deleted on archiving.
+#
+# The app runs archive_resolved() once every ARCHIVE_INTERVAL_HOURS, on a
+# background thread started by a request (archive_in_background); a stamp
+# file next to the archive records the last run, so only one worker does it.
+# Deployments that prefer cron can set ARCHIVE_INTERVAL_HOURS=0 and run e.g.
+#
+#   15 3 * * *  cd /srv/civic/Civicissueproject && python archive.py
+#
+#   python archive.py                 # archive with the configured age
+#   python archive.py --days 90
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import complaint_cache
+import file_locks
+from database import DB_NAME, get_db_connection
+
+# --- Config ---
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", 24))  # 0: only from cron / the CLI
+ARCHIVE_BATCH = 500  # rows per transaction (stays under SQLite's 999 bound parameters)
+ARCHIVED_TABLES = ("complaints", "status_history")
+STAMP_CHECK_INTERVAL = 60  # seconds between looks at the stamp file, per process
+
+_background_lock = threading.Lock()
+_next_stamp_check = 0.0
+
+
+def archive_path(source=DB_NAME):
+    """Returns the archive file that belongs to a live database file."""
+    root, ext = os.path.splitext(source)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def attach(conn, readonly=False, source=DB_NAME):
+    """Attaches the archive as schema `archive`. With readonly, returns False if there is none yet."""
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list")):
+        return True
+    path = archive_path(source)
+    if readonly and not os.path.exists(path):
+        return False  # don't create an empty archive just to read it
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    return True
+
+
+def _columns(conn, table, schema="main"):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def ensure_schema(conn):
+    """Creates the archive tables from the live schema and adds any columns added since."""
+    for table in ARCHIVED_TABLES:
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                           (table,)).fetchone()[0]
+        conn.execute(sql.replace(f"CREATE TABLE {table}", f"CREATE TABLE IF NOT EXISTS archive.{table}", 1))
+        archived = set(_columns(conn, table, "archive"))
+        for cid, name, decl, *_ in conn.execute(f"PRAGMA main.table_info({table})"):
+            if name not in archived:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {decl}")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_complaints_user ON complaints (user_phone)")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_history_complaint ON status_history (complaint_id)")
+
+
+def complaints_source(conn, include_archive=False):
+    """FROM-clause for complaints: the live table, or live UNION ALL archive.
+
+    Use as f"SELECT ... FROM {complaints_source(conn, True)} WHERE ...".
+    Falls back to the live table when there is no archive yet.
+    """
+    if not include_archive or not attach(conn, readonly=True):
+        return "complaints"
+    cols = ", ".join(_columns(conn, "complaints"))
+    archived = set(_columns(conn, "complaints", "archive"))
+    archive_cols = ", ".join(c if c in archived else f"NULL AS {c}" for c in _columns(conn, "complaints"))
+    return (f"(SELECT {cols} FROM main.complaints "
+            f"UNION ALL SELECT {archive_cols} FROM archive.complaints) AS complaints")
+
+
+# -------------------------
+# Archiving
+# -------------------------
+def _enable_incremental_vacuum(conn):
+    # auto_vacuum can only be switched on by rebuilding the file once
+    if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] != 2:
+        print("Switching civic.db to incremental auto-vacuum (one-time VACUUM)...")
+        conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM main")
+
+
+def archive_resolved(older_than_days=None, batch_size=ARCHIVE_BATCH, vacuum=True):
+    """Moves old resolved complaints and their history to the archive. Returns complaints moved."""
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+
+    conn = get_db_connection()
+    attach(conn)
+    ensure_schema(conn)
+    conn.commit()
+    complaint_cols = ", ".join(_columns(conn, "complaints"))
+    history_cols = ", ".join(_columns(conn, "status_history"))
+
+    moved = 0
+    while True:
+        # A ticket that live duplicates still point at stays hot until they are archived too
+        ids = [row[0] for row in conn.execute(
+            """SELECT c.id FROM main.complaints c
+               WHERE lower(trim(c.status)) = 'resolved' AND c.updated_at < ?
+                     AND NOT EXISTS (SELECT 1 FROM main.complaints d WHERE d.duplicate_of = c.id)
+               ORDER BY c.id LIMIT ?""", (cutoff, batch_size))]
+        if not ids:
+            break
+        marks = ", ".join("?" * len(ids))
+        conn.execute(f"INSERT INTO archive.complaints ({complaint_cols}) "
+                     f"SELECT {complaint_cols} FROM main.complaints WHERE id IN ({marks})", ids)
+        conn.execute(f"INSERT INTO archive.status_history ({history_cols}) "
+                     f"SELECT {history_cols} FROM main.status_history WHERE complaint_id IN ({marks})", ids)
+        conn.execute(f"DELETE FROM main.status_history WHERE complaint_id IN ({marks})", ids)
+        conn.execute(f"DELETE FROM main.triage_suggestions WHERE complaint_id IN ({marks})", ids)
+        conn.execute(f"DELETE FROM main.complaints WHERE id IN ({marks})", ids)
+        conn.commit()
+        complaint_cache.invalidate(*ids)
+        moved += len(ids)
+
+    if vacuum and moved:
+        _enable_incremental_vacuum(conn)
+        conn.execute("PRAGMA main.incremental_vacuum").fetchall()  # runs one step per row fetched
+    conn.close()
+    return moved
+
+
+# -------------------------
+# Scheduling
+# -------------------------
+def _stamp_path(source=DB_NAME):
+    return f"{archive_path(source)}.last_run"
+
+
+def _due(stamp):
+    try:
+        st = os.stat(stamp)
+    except OSError:
+        return True  # never ran
+    # Empty: just created by a worker about to take the lock, not a finished run
+    return st.st_size == 0 or time.time() - st.st_mtime >= ARCHIVE_INTERVAL_HOURS * 3600
+
+
+def archive_in_background():
+    """Starts archive_resolved() on a background thread if no worker ran it within ARCHIVE_INTERVAL_HOURS."""
+    global _next_stamp_check
+    if not ARCHIVE_INTERVAL_HOURS:
+        return False
+    with _background_lock:
+        if time.monotonic() < _next_stamp_check:
+            return False
+        _next_stamp_check = time.monotonic() + STAMP_CHECK_INTERVAL
+    if not _due(_stamp_path()):
+        return False
+    threading.Thread(target=_archive_quietly, name="archive", daemon=True).start()
+    return True
+
+
+def _archive_quietly():
+    stamp = _stamp_path()
+    with open(stamp, "a+b") as f:
+        if not file_locks.lock(f, blocking=False) or not _due(stamp):
+            return  # another worker is on it, or just finished
+        try:
+            moved = archive_resolved()
+            if moved:
+                print(f"📦 {moved} resolved complaints moved to {archive_path()}")
+        except Exception as e:  # retried at the next interval, not on every request
+            print(f"⚠️ Archiving failed: {e}")
+        finally:
+            f.truncate(0)
+            f.write(datetime.utcnow().isoformat().encode())
+            f.flush()
+            file_locks.unlock(f)
+
+
+if __name__ == "__main__":
+    import sys
+    days = int(sys.argv[sys.argv.index("--days") + 1]) if "--days" in sys.argv else None
+    print(f"✅ {archive_resolved(days)} resolved complaints moved to {archive_path()}")
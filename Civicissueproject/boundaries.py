@@ -0,0 +1,191 @@
+# boundaries.py
+# Per-state district boundaries, preprocessed once from gadm41_IND_2.
+#
+# build() reads the shapefile a single time and writes, for every state:
+#
+#   static/boundaries/<state>/coarse.geojson   small, for state-wide views
+#   static/boundaries/<state>/medium.geojson
+#   static/boundaries/<state>/fine.geojson     for zoomed-in district views
+#   static/boundaries/<state>/aliases.json     spelling -> canonical district
+#   static/boundaries/index.json               states, bbox/center, file sizes
+#
+# Geometries are simplified with shapely.coverage_simplify, which keeps the
+# borders shared by neighbouring districts identical (no slivers or gaps), and
+# coordinates are rounded to what each level can show. At runtime only the
+# small JSON files are read; the shapefile is never parsed per request.
+#
+# Building is a deploy step, never done on a request: until index.json exists
+# load_index() returns {} and the admin dashboard is shown without its map.
+#
+#   python boundaries.py            # (re)build everything
+import json
+import os
+import re
+from functools import lru_cache
+
+from compression import precompress_file
+from piu import DISTRICT_MAP
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHAPEFILE = os.path.join(BASE_DIR, "data", "gadm41_IND_2.shp")
+OUT_DIR = os.path.join(BASE_DIR, "static", "boundaries")
+
+# level -> (simplification tolerance in degrees, coordinate decimals)
+LEVELS = {
+    "coarse": (0.02, 3),
+    "medium": (0.005, 4),
+    "fine": (0.001, 5),
+}
+
+# Extra spellings that citizens use, per state (normalized -> shapefile NAME_2)
+EXTRA_ALIASES = {
+    "Odisha": {k: v for k, v in DISTRICT_MAP.items()},
+}
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", (name or "").lower()).strip("-")
+
+
+def normalize(name):
+    """Alias lookup key: lowercase, no punctuation/whitespace differences."""
+    return re.sub(r"[^a-z0-9]+", "", (name or "").lower())
+
+
+def level_for_zoom(zoom):
+    """Which preprocessed resolution a Leaflet zoom level should load."""
+    zoom = int(zoom)
+    if zoom <= 6:
+        return "coarse"
+    if zoom <= 9:
+        return "medium"
+    return "fine"
+
+
+# -------------------------
+# Build (one shapefile pass)
+# -------------------------
+def _feature_collection(geoms, names, keys, decimals):
+    import numpy as np
+    import shapely
+
+    rounded = shapely.transform(geoms, lambda coords: np.round(coords, decimals))
+    features = []
+    for geom, name, key in zip(rounded, names, keys):
+        features.append({"type": "Feature",
+                         "properties": {"NAME_2": name, "district_key": key},
+                         "geometry": json.loads(shapely.to_geojson(geom))})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def build(shapefile=None, out_dir=None):
+    """Preprocesses every state into multi-resolution GeoJSON + alias tables."""
+    import geopandas as gpd
+    import numpy as np
+    import shapely
+
+    out_dir = out_dir or OUT_DIR
+    gdf = gpd.read_file(shapefile or SHAPEFILE)
+    index = {}
+    for state, sdf in gdf.groupby("NAME_1"):
+        slug = slugify(state)
+        state_dir = os.path.join(out_dir, slug)
+        os.makedirs(state_dir, exist_ok=True)
+
+        geoms = np.asarray(sdf.geometry.values, dtype=object)
+        names = sdf["NAME_2"].tolist()
+
+        # Canonical alias table: NAME_2, GADM variant names, then curated extras
+        aliases = {normalize(n): n for n in names}
+        for name, variants in zip(names, sdf.get("VARNAME_2", [None] * len(names))):
+            if not isinstance(variants, str):
+                continue
+            for variant in variants.split("|"):
+                if variant.strip():
+                    aliases.setdefault(normalize(variant), name)
+        canonical = {n.lower(): n for n in names}
+        for alias, target in EXTRA_ALIASES.get(state, {}).items():
+            if target.lower() in canonical:
+                aliases[normalize(alias)] = canonical[target.lower()]
+        # The DB key for a district is the first curated alias, else its normalized name
+        key_of = {n: normalize(n) for n in names}
+        for alias, target in EXTRA_ALIASES.get(state, {}).items():
+            if target.lower() in canonical:
+                key_of[canonical[target.lower()]] = alias
+        keys = [key_of[n] for n in names]
+
+        levels = {}
+        for level, (tolerance, decimals) in LEVELS.items():
+            simplified = shapely.coverage_simplify(geoms, tolerance)
+            path = os.path.join(state_dir, f"{level}.geojson")
+            size = _write_json(path, _feature_collection(simplified, names, keys, decimals))
+            levels[level] = {"tolerance": tolerance, "bytes": size, "compressed": precompress_file(path)}
+        _write_json(os.path.join(state_dir, "aliases.json"), aliases)
+
+        minx, miny, maxx, maxy = sdf.total_bounds
+        index[slug] = {"name": state, "bbox": [float(miny), float(minx), float(maxy), float(maxx)],
+                       "center": [float((miny + maxy) / 2), float((minx + maxx) / 2)],
+                       "districts": len(names), "levels": levels}
+
+    _write_json(os.path.join(out_dir, "index.json"), index)
+    _read_index.cache_clear()
+    load_geojson.cache_clear()
+    load_aliases.cache_clear()
+    return index
+
+
+# -------------------------
+# Runtime lookups (preprocessed files only)
+# -------------------------
+@lru_cache(maxsize=1)
+def _read_index():
+    with open(os.path.join(OUT_DIR, "index.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index():
+    """The state index written by build(), or {} if it hasn't been built yet."""
+    try:
+        return _read_index()
+    except FileNotFoundError:  # not cached: picked up once `python boundaries.py` has run
+        print(f"⚠️ No district boundaries in {OUT_DIR}: run python boundaries.py")
+        return {}
+
+
+def state_info(state):
+    """Index entry for a state (by name or slug), or None."""
+    return load_index().get(slugify(state))
+
+
+@lru_cache(maxsize=64)
+def load_geojson(state, level="medium"):
+    with open(os.path.join(OUT_DIR, slugify(state), f"{level}.geojson"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=64)
+def load_aliases(state):
+    with open(os.path.join(OUT_DIR, slugify(state), "aliases.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def canonical_district(state, name):
+    """Maps any known spelling of a district to its shapefile NAME_2, or None."""
+    return load_aliases(state).get(normalize(name))
+
+
+if __name__ == "__main__":
+    print("Preprocessing", SHAPEFILE)
+    for slug, info in build().items():
+        sizes = ", ".join(f"{lvl} {meta['bytes'] // 1024} KB ({meta['compressed'].get('gzip', meta['bytes']) // 1024} KB gzip)"
+                          for lvl, meta in info["levels"].items())
+        print(f"  {info['name']}: {info['districts']} districts ({sizes})")
+    print("✅ Written to", OUT_DIR)
@@ -0,0 +1,215 @@
+# charts.py
+# Admin dashboard chart data and rendering. Kept out of app.py so pandas and
+# matplotlib are only imported when a chart is actually needed.
+#
+# chart_series() produces the compact per-chart series. By default the
+# dashboard fetches them as JSON and draws them in the browser
+# (static/js/minicharts.js); the PNG path below is the print/fallback view.
+#
+# Charts are drawn on their own Figure/FigureCanvasAgg (no pyplot global
+# state), so they can render side by side on a thread or process pool and two
+# admin requests can't draw into each other's figure. Each PNG is written to a
+# temp file and renamed into place, so a half-written image is never served.
+#
+#   python charts.py --bench      # serial vs thread vs process wall time
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from database import get_db_df
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHART_FOLDER = os.path.join(BASE_DIR, "static", "admin_charts")
+
+# "thread" (default), "process" or "serial"
+CHART_EXECUTOR = os.environ.get("CHART_EXECUTOR", "thread")
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", 4))
+
+# chart key -> PNG file name under CHART_FOLDER
+CHART_FILES = {
+    'status': 'status_bar.png',
+    'department': 'department_pie.png',
+    'pincode': 'pincode_bar.png',
+    'time': 'time_line.png',
+    'district': 'district_bar.png',
+    'dept_status': 'dept_status.png',
+}
+
+_executors = {}
+
+
+# -------------------------
+# Data (plain lists, so specs can cross a process boundary)
+# -------------------------
+def _counts(series, fill, top=None):
+    counts = series.fillna(fill).value_counts()
+    if top:
+        counts = counts.head(top)
+    return [str(k) for k in counts.index], [int(v) for v in counts.values]
+
+
+def chart_series(df):
+    """Aggregates every dashboard chart into a {key: spec} dict of plain lists."""
+    if 'duplicate_of' in df.columns:
+        df = df[df['duplicate_of'].isna()]  # count each issue once
+    if df.empty:
+        return {}
+
+    specs = {}
+
+    labels, values = _counts(df['status'], 'Pending')
+    specs['status'] = {'kind': 'bar', 'title': 'Complaints by Status',
+                       'labels': labels, 'values': values, 'color': '#0a66ff'}
+
+    labels, values = _counts(df['department'], 'Unknown')
+    specs['department'] = {'kind': 'pie', 'title': 'Complaints by Department',
+                           'labels': labels, 'values': values}
+
+    labels, values = _counts(df['pincode'], 'Unknown', top=10)
+    specs['pincode'] = {'kind': 'bar', 'title': 'Top 10 Pincodes by Complaints',
+                        'labels': labels, 'values': values, 'color': '#28a745',
+                        'xlabel': 'Pincode', 'ylabel': 'Complaints'}
+
+    # Complaints Over Time, from the same rows as the other charts
+    if 'updated_at' in df.columns:
+        import pandas as pd
+        days = pd.to_datetime(df['updated_at'], errors='coerce').dropna().dt.to_period('D')
+        time_counts = days.value_counts().sort_index()
+        if not time_counts.empty:
+            specs['time'] = {'kind': 'line', 'title': 'Complaints Over Time',
+                             'labels': [str(p) for p in time_counts.index],
+                             'values': [int(v) for v in time_counts.values],
+                             'dates': True, 'xlabel': 'Date', 'ylabel': 'Count'}
+
+    labels, values = _counts(df['district'], 'Unknown', top=10)
+    specs['district'] = {'kind': 'bar', 'title': 'Complaints by District (Top 10)',
+                         'labels': labels, 'values': values, 'color': '#ffc107',
+                         'xlabel': 'District', 'ylabel': 'Complaints'}
+
+    dept_status = df.pivot_table(index='department', columns='status',
+                                 aggfunc='size', fill_value=0)
+    if not dept_status.empty:
+        specs['dept_status'] = {'kind': 'stacked', 'title': 'Department vs Status',
+                                'labels': [str(i) for i in dept_status.index],
+                                'series': {str(col): [int(v) for v in dept_status[col]]
+                                           for col in dept_status.columns},
+                                'xlabel': 'Department', 'ylabel': 'Complaints'}
+    return specs
+
+
+# -------------------------
+# Rendering (one Figure per chart, no pyplot)
+# -------------------------
+def _atomic_save(fig, path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.png.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            fig.savefig(f, format='png')
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_chart(spec, path):
+    """Draws one chart spec onto a private Agg canvas and writes it to `path`."""
+    # Deferred: the JSON chart API (chart_series) never needs matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec.get('figsize'))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    kind, labels = spec['kind'], spec['labels']
+    if kind == 'bar':
+        ax.bar(labels, spec['values'], edgecolor='black', color=spec.get('color'))
+        ax.tick_params(axis='x', labelrotation=90)
+    elif kind == 'pie':
+        ax.pie(spec['values'], labels=labels, autopct='%1.1f%%')
+    elif kind == 'line' and spec.get('dates'):
+        # A real date axis: gaps between days keep their width, ticks thin out
+        from datetime import date
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+        ax.plot([date.fromisoformat(label) for label in labels], spec['values'], marker='o')
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    elif kind == 'line':
+        ax.plot(labels, spec['values'], marker='o')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == 'stacked':
+        bottom = [0] * len(labels)
+        for name, values in spec['series'].items():
+            ax.bar(labels, values, bottom=bottom, label=name)
+            bottom = [b + v for b, v in zip(bottom, values)]
+        ax.legend(title='status')
+        ax.tick_params(axis='x', labelrotation=90)
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+
+    ax.set_title(spec['title'])
+    ax.set_xlabel(spec.get('xlabel', ''))
+    ax.set_ylabel(spec.get('ylabel', ''))
+    fig.tight_layout()
+    _atomic_save(fig, path)
+    return path
+
+
+def _get_executor(kind):
+    if kind not in _executors:
+        pool = ProcessPoolExecutor if kind == 'process' else ThreadPoolExecutor
+        _executors[kind] = pool(max_workers=CHART_WORKERS)
+    return _executors[kind]
+
+
+def render_all(specs, chart_folder=CHART_FOLDER, executor=None):
+    """Renders every spec (in parallel unless executor='serial'); returns {key: static path}."""
+    executor = executor or CHART_EXECUTOR
+    jobs = {key: (spec, os.path.join(chart_folder, CHART_FILES[key])) for key, spec in specs.items()}
+
+    if executor == 'serial':
+        for spec, path in jobs.values():
+            render_chart(spec, path)
+    else:
+        pool = _get_executor(executor)
+        futures = [pool.submit(render_chart, spec, path) for spec, path in jobs.values()]
+        for f in futures:
+            f.result()  # re-raise any rendering error
+
+    return {key: f'admin_charts/{CHART_FILES[key]}' for key in jobs}
+
+
+def generate_charts(chart_folder=CHART_FOLDER):
+    """Renders the admin dashboard charts as PNGs and returns their static paths."""
+    return render_all(chart_series(get_db_df()), chart_folder)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(rounds=5):
+    """Prints the wall time to render the full chart set serially vs pooled."""
+    import time
+
+    specs = chart_series(get_db_df())
+    if not specs:
+        print("No complaints to chart.")
+        return
+    with tempfile.TemporaryDirectory() as out:
+        for executor in ('serial', 'thread', 'process'):
+            render_all(specs, out, executor)  # warm up (pool start, font cache)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                render_all(specs, out, executor)
+            elapsed = (time.perf_counter() - start) / rounds
+            print(f"{executor:>8}: {elapsed * 1000:7.1f} ms per dashboard ({len(specs)} charts)")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        print(generate_charts())
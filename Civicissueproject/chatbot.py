@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify, session, url_for
 from datetime import datetime
-import sqlite3
 # Import from the new database.py file, NOT from app.py
-from database import get_complaint_by_id, DB_NAME
+from database import get_complaint_by_id, record_status_change
+import triage
+import write_queue
 
 chat_bp = Blueprint('chatbot', __name__)
 
@@ -59,15 +60,33 @@ def chat():
     elif current_stage == 'ASK_PHONE':
         if user_message.isdigit() and len(user_message) == 10:
             state['phone'] = user_message
-            bot_response = "Thanks. Now for the location. Which district is this in?"
+            bot_response = ("Thanks. Now for the location. Which district is this in? "
+                            "You can also share your location as 'latitude, longitude'.")
             state['stage'] = 'ASK_DISTRICT'
         else:
             bot_response = "That doesn't seem like a valid 10-digit phone number. Please try again."
 
     elif current_stage == 'ASK_DISTRICT':
-        state['district'] = user_message.title()
-        bot_response = "Which block?"
-        state['stage'] = 'ASK_BLOCK'
+        # Coordinates come either from the widget (JSON latitude/longitude) or typed as "lat, lon"
+        lat, lon = request.json.get('latitude'), request.json.get('longitude')
+        if lat is None and user_message.count(',') == 1:
+            lat, lon = (p.strip() for p in user_message.split(','))
+        geo_district = None
+        if lat is not None and lon is not None:
+            from geocoder import resolve_location  # shapely/geopandas load on first use
+            lat, lon, geo_state, geo_district = resolve_location(lat, lon)
+            if lat is not None:
+                state.update(latitude=lat, longitude=lon, geo_state=geo_state, geo_district=geo_district)
+        if geo_district:
+            state['district'] = geo_district
+            bot_response = f"Got it, that's in {geo_district} district. Which block?"
+            state['stage'] = 'ASK_BLOCK'
+        elif lat is not None and lon is not None:
+            bot_response = "I couldn't place that location. Please type the district name instead."
+        else:
+            state['district'] = user_message.title()
+            bot_response = "Which block?"
+            state['stage'] = 'ASK_BLOCK'
 
     elif current_stage == 'ASK_BLOCK':
         state['block'] = user_message.title()
@@ -103,17 +122,28 @@ def chat():
         if 'yes' in user_message:
             try:
                 user_phone = session.get('user')
-                conn = sqlite3.connect(DB_NAME)
-                c = conn.cursor()
-                c.execute('''INSERT INTO complaints (user_phone, name, phone, district, block, gp, village, landmark, pincode, department, complaint, status, updated_at) 
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (user_phone, state.get('name'), state.get('phone'), state.get('district'), state.get('block'), state.get('gp'), state.get('village'),
-                           state.get('landmark'), state.get('pincode'), state.get('department'), state.get('complaint'), 'Pending', datetime.utcnow().isoformat()))
-                conn.commit()
-                complaint_id = c.lastrowid
-                conn.close()
+                import duplicates
+                duplicate_of = duplicates.find_duplicate(state.get('district'), state.get('village'),
+                                                         state.get('department'), state.get('complaint'))
+                def insert(conn):
+                    c = conn.execute('''INSERT INTO complaints (user_phone, name, phone, district, block, gp, village, landmark, pincode, department, complaint, status, updated_at, duplicate_of,
+                                                         latitude, longitude, geo_state, geo_district) 
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (user_phone, state.get('name'), state.get('phone'), state.get('district'), state.get('block'), state.get('gp'), state.get('village'),
+                               state.get('landmark'), state.get('pincode'), state.get('department'), state.get('complaint'), 'Pending', datetime.utcnow().isoformat(), duplicate_of,
+                               state.get('latitude'), state.get('longitude'), state.get('geo_state'), state.get('geo_district')))
+                    record_status_change(conn, c.lastrowid, None, 'Pending')
+                    return c.lastrowid
+
+                complaint_id = write_queue.submit(insert)
+                triage.enqueue(complaint_id, state.get('complaint'))
                 upload_url = url_for('uploads.upload_proof_page', cid=complaint_id)
                 bot_response = f"Thank you! Your complaint is submitted. Your ticket ID is #{complaint_id}. <a href='{upload_url}' target='_blank'>Click here to upload photo/video proof now.</a>"
+                if duplicate_of:
+                    bot_response += f" It looks like the same issue as ticket #{duplicate_of}, so we've linked them."
+                else:
+                    duplicates.index_complaint(complaint_id, state.get('district'), state.get('village'),
+                                               state.get('department'), state.get('complaint'))
                 state.clear(); state['stage'] = 'INIT'
             except Exception as e:
                 bot_response = f"An error occurred: {e}. I've canceled this report. Please try again."
@@ -126,7 +156,7 @@ def chat():
     elif current_stage == 'ASK_TICKET_ID':
         try:
             ticket_id = int(user_message.strip())
-            complaint = get_complaint_by_id(ticket_id)
+            complaint = get_complaint_by_id(ticket_id, include_archive=True)
             if complaint and complaint['user_phone'] == session['user']:
                 status = complaint['status']
                 bot_response = f"The status for ticket #{ticket_id} is: '{status}'."
@@ -0,0 +1,208 @@
+# community.py
+# The public /community feedback wall, cached.
+#
+# The page is public and read far more often than feedback is written, and
+# there are only a few filter combinations (type x minimum rating x sort). So
+# each worker keeps the rendered HTML per normalized filter tuple in a small
+# LRU, together with the per-type rating histograms and averages, which are
+# computed once per version of the feedback table instead of per request.
+#
+# Validity follows the 'feedback' counter in row_versions (see api_v1.py),
+# which the triggers on the feedback table bump on every write, from
+# submit_feedback or anywhere else. A hit reads that one counter and returns
+# the stored HTML, so every gunicorn worker drops stale pages on its next
+# request without the workers having to talk to each other.
+#
+# Filter values outside the known set are rendered without the cache, so a
+# crawler can't fill it with junk keys.
+#
+#   python community.py --bench       # render time per hit / miss over all filter combinations
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import render_template
+
+# --- Config ---
+CACHE_ENABLED = os.environ.get("COMMUNITY_CACHE", "1") == "1"
+CACHE_SIZE = int(os.environ.get("COMMUNITY_CACHE_SIZE", 144))  # pages; 6 types x 6 ratings x 4 sorts
+FEEDBACK_TYPES = {"general": "General Feedback", "complaint": "Complaint Process", "suggestion": "Suggestion",
+                  "technical": "Technical Issue", "other": "Other"}
+RATINGS = ("all", "5", "4", "3", "2", "1")
+SORTS = {"newest": "id DESC", "oldest": "id ASC",
+         "highest": "rating DESC, id DESC", "lowest": "rating ASC, id ASC"}
+
+_pages = OrderedDict()  # (type, rating, sort) -> (html, version)
+_summary = None  # (summary, version)
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0, "uncached": 0}
+
+
+def create_tables(conn):
+    """Indexes behind the type / rating filters and the rating sorts."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_type_rating ON feedback (type, rating)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_rating ON feedback (rating)")
+
+
+def _connection():
+    # One read connection per thread, reopened after a fork
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        from database import get_db_connection
+        conn = get_db_connection()
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def _version(conn):
+    try:
+        row = conn.execute("SELECT version FROM row_versions WHERE scope = 'feedback'").fetchone()
+    except sqlite3.OperationalError:
+        return None  # row_versions not created yet: don't cache
+    return row[0] if row else 0
+
+
+# -------------------------
+# Filters
+# -------------------------
+def normalize(department, rating, sort):
+    """(type, rating, sort, cacheable) with defaults filled in."""
+    department = (department or "all").strip().lower()
+    rating = (rating or "all").strip().lower()
+    sort = (sort or "newest").strip().lower()
+    if rating not in RATINGS:
+        rating = "all"
+    if sort not in SORTS:
+        sort = "newest"
+    return department, rating, sort, department == "all" or department in FEEDBACK_TYPES
+
+
+def _query(conn, department, rating, sort):
+    where, params = [], []
+    if department != "all":
+        where.append("type = ?")
+        params.append(department)
+    if rating != "all":
+        where.append("rating >= ?")
+        params.append(int(rating))
+    sql = "SELECT id, name, type, rating, message, created_at FROM feedback"  # never the email
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(f"{sql} ORDER BY {SORTS[sort]}", params).fetchall()
+
+
+def summarize(conn):
+    """Per-type and overall rating histograms and averages, from the (type, rating) index alone."""
+    counts = conn.execute("SELECT type, rating, COUNT(*) FROM feedback GROUP BY type, rating").fetchall()
+    known = [t for t in FEEDBACK_TYPES if any(row[0] == t for row in counts)]
+    others = sorted({row[0] for row in counts} - set(FEEDBACK_TYPES))
+
+    def bucket(label, rows):
+        histogram = {stars: 0 for stars in range(5, 0, -1)}
+        for _, rating, count in rows:
+            if rating in histogram:
+                histogram[rating] += count
+        total = sum(count for _, _, count in rows)
+        average = round(sum(rating * count for _, rating, count in rows) / total, 1) if total else None
+        return {"label": label, "count": total, "average": average, "histogram": histogram,
+                "peak": max(histogram.values())}
+
+    return {"overall": bucket("All feedback", counts),
+            "types": [bucket(FEEDBACK_TYPES.get(t, t), [row for row in counts if row[0] == t])
+                      for t in known + others]}
+
+
+# -------------------------
+# Page
+# -------------------------
+def _render(conn, department, rating, sort, summary):
+    return render_template("community.html",
+                           feedbacks=_query(conn, department, rating, sort),
+                           summary=summary,
+                           feedback_types=FEEDBACK_TYPES,
+                           selected_department=department,
+                           selected_rating=rating,
+                           selected_sort=sort)
+
+
+def page(department, rating, sort):
+    """The rendered /community HTML for these filters, from the cache when it is current."""
+    global _summary
+    department, rating, sort, cacheable = normalize(department, rating, sort)
+    key = (department, rating, sort)
+    conn = _connection()
+    version = _version(conn) if CACHE_ENABLED else None
+
+    with _lock:
+        entry = _pages.get(key) if cacheable and version is not None else None
+        if entry is not None and entry[1] == version:
+            _pages.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0]
+        summary = _summary[0] if version is not None and _summary and _summary[1] == version else None
+
+    if summary is None:
+        summary = summarize(conn)
+    html = _render(conn, department, rating, sort, summary)
+    with _lock:
+        if version is None or not cacheable:
+            _stats["uncached"] += 1
+            return html
+        _stats["misses"] += 1
+        _summary = (summary, version)
+        _pages[key] = (html, version)
+        _pages.move_to_end(key)
+        while len(_pages) > CACHE_SIZE:
+            _pages.popitem(last=False)
+    return html
+
+
+def invalidate():
+    """Drops this worker's pages at once; other workers see the row_versions bump."""
+    global _summary
+    with _lock:
+        _pages.clear()
+        _summary = None
+
+
+def stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(_stats, size=len(_pages), capacity=CACHE_SIZE, enabled=CACHE_ENABLED,
+                    hit_ratio=round(_stats["hits"] / lookups, 4) if lookups else None)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(rounds=20):
+    """Prints the mean /community latency over every filter combination, cold vs cached."""
+    import app as civic
+    import community  # the module app uses, not __main__
+
+    client = civic.app.test_client()
+    urls = [f"/community?department={t}&rating={r}&sort={s}"
+            for t in ["all", *FEEDBACK_TYPES] for r in RATINGS for s in SORTS]
+    for label, enabled in (("uncached", False), ("cached  ", True)):
+        community.CACHE_ENABLED = enabled
+        community.invalidate()
+        for url in urls:  # warm up templates and, when on, the cache
+            client.get(url).get_data()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for url in urls:
+                client.get(url).get_data()
+        per_request = (time.perf_counter() - start) / (rounds * len(urls)) * 1000
+        print(f"{label}: {per_request:6.2f} ms per /community request over {len(urls)} filter combinations")
+    print(f"   cache: {community.stats()}")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        print("Usage: python community.py --bench")
@@ -0,0 +1,118 @@
+# complaint_cache.py
+# Read-through cache of complaint rows by id (see database.get_complaint_by_id).
+#
+# Each worker keeps a bounded LRU (COMPLAINT_CACHE_SIZE rows) whose entries
+# expire after COMPLAINT_CACHE_TTL seconds. The write helpers in database.py
+# call invalidate() after they commit.
+#
+# Gunicorn workers are separate processes, so a write in one worker must also
+# reach the others. With COMPLAINT_CACHE_SHARED on (the default), every id
+# maps to a slot in a small memory-mapped file next to the database
+# (civic_cache.bin). Each slot holds a counter. invalidate() bumps the counter
+# under a file lock. A cached row remembers the counter it was read under and
+# is only used while the counter hasn't moved. So a hit costs one 8-byte read
+# from shared memory, with no query. Ids that share a slot invalidate each
+# other now and then, which only costs a re-read.
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import file_locks
+
+# --- Config ---
+CACHE_SIZE = int(os.environ.get("COMPLAINT_CACHE_SIZE", 2048))
+CACHE_TTL = float(os.environ.get("COMPLAINT_CACHE_TTL", 30))  # seconds
+SHARED = os.environ.get("COMPLAINT_CACHE_SHARED", "1") == "1"
+SLOTS = 4096
+_SLOT = struct.Struct("<Q")
+
+_entries = OrderedDict()  # cid -> (row, version, expires_at)
+_lock = threading.Lock()
+_open_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_shared = None  # (file object, mmap) once opened
+
+
+def _versions_path():
+    from database import DB_NAME  # imported here: database imports this module
+    root, _ = os.path.splitext(DB_NAME)
+    return f"{root}_cache.bin"
+
+
+def _shared_map():
+    global _shared
+    if _shared is None:
+        with _open_lock:
+            if _shared is None:
+                f = open(_versions_path(), "a+b")
+                file_locks.lock(f)
+                if os.fstat(f.fileno()).st_size < SLOTS * _SLOT.size:
+                    f.truncate(SLOTS * _SLOT.size)
+                file_locks.unlock(f)
+                _shared = (f, mmap.mmap(f.fileno(), SLOTS * _SLOT.size))
+    return _shared[1]
+
+
+def version(cid):
+    """Current shared version of `cid`'s slot (0 when sharing is off). Read it before the SELECT."""
+    if not SHARED:
+        return 0
+    return _SLOT.unpack_from(_shared_map(), (int(cid) % SLOTS) * _SLOT.size)[0]
+
+
+def get(cid):
+    """The cached row for `cid`, or None on a miss."""
+    with _lock:
+        entry = _entries.get(cid)
+        if entry is not None:
+            row, row_version, expires_at = entry
+            if time.monotonic() < expires_at and row_version == version(cid):
+                _entries.move_to_end(cid)
+                _stats["hits"] += 1
+                return row
+            del _entries[cid]
+        _stats["misses"] += 1
+    return None
+
+
+def put(cid, row, row_version):
+    """Caches `row`, read under `row_version` (from version(), taken before the query)."""
+    with _lock:
+        _entries[cid] = (row, row_version, time.monotonic() + CACHE_TTL)
+        _entries.move_to_end(cid)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def invalidate(*cids):
+    """Drops `cids` here and, when shared, in every other worker. Call after the write commits."""
+    with _lock:
+        for cid in cids:
+            _entries.pop(cid, None)
+        _stats["invalidations"] += len(cids)
+    if SHARED and cids:
+        mapped = _shared_map()
+        lock_file = _shared[0]
+        file_locks.lock(lock_file)  # no lost increments between workers
+        try:
+            for cid in cids:
+                offset = (int(cid) % SLOTS) * _SLOT.size
+                _SLOT.pack_into(mapped, offset, _SLOT.unpack_from(mapped, offset)[0] + 1)
+        finally:
+            file_locks.unlock(lock_file)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    """This worker's hit ratio and size."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(_stats, size=len(_entries), capacity=CACHE_SIZE, ttl=CACHE_TTL, shared=SHARED,
+                    hit_ratio=round(_stats["hits"] / lookups, 4) if lookups else None)
@@ -0,0 +1,243 @@
+# compression.py
+# gzip / brotli for everything text-like the app sends.
+#
+# Dynamic responses (dashboard HTML, JSON, CSV, GeoJSON) are compressed in an
+# after_request hook when the client accepts it and the body is at least
+# COMPRESS_MIN_SIZE bytes; streamed responses are compressed chunk by chunk.
+# Brotli is used when the optional `brotli` package is installed, else gzip.
+#
+# Files (static CSS/JS, the generated heatmap, boundary GeoJSON) are not
+# compressed per request. build() writes .gz/.br siblings next to them once,
+# and send_precompressed() serves the sibling the client accepts, provided it
+# is newer than the original.
+#
+#   python compression.py --build     # write .gz/.br siblings for static assets
+#   python compression.py --bench     # bytes and transfer time saved per page
+import gzip
+import mimetypes
+import os
+import zlib
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+# --- Config ---
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))  # bytes; smaller isn't worth it
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))  # 11 is for build(), too slow per request
+STREAM_FLUSH_BYTES = 16 * 1024
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/csv", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "application/geo+json", "image/svg+xml",
+}
+PRECOMPRESS_DIRS = [os.path.join(STATIC_DIR, d) for d in ("css", "js", "admin_charts", "boundaries")]
+PRECOMPRESS_EXTENSIONS = {".css", ".js", ".html", ".json", ".geojson", ".svg", ".csv", ".txt"}
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+mimetypes.add_type("application/geo+json", ".geojson")
+
+
+def _encodings():
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+
+def negotiate(available=None):
+    """Best Content-Encoding the client accepts among `available`, or None."""
+    available = _encodings() if available is None else available
+    best = request.accept_encodings.best_match(available)
+    return best if best in available else None
+
+
+def compress(data, encoding, level=None):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def _compress_stream(chunks, encoding):
+    # Flush every STREAM_FLUSH_BYTES of input so the client can render while the
+    # body streams; flushing every tiny chunk would cost more than it saves.
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        process, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    pending = 0
+    for chunk in chunks:
+        out = process(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_BYTES:
+            out += flush()
+            pending = 0
+        if out:
+            yield out
+    yield finish()
+
+
+def compress_response(response):
+    """after_request hook: compresses text-like responses the client can decode."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream((c.encode() if isinstance(c, str) else c
+                                              for c in response.response), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def etag_matches(etag):
+    """The If-None-Match tag naming `etag`, as sent plain or by compress_response ("<etag>-br"), else None.
+
+    Lets a view answer 304 before doing any work.
+    """
+    for tag in [etag] + [f"{etag}-{encoding}" for encoding in SUFFIXES]:
+        if request.if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+# -------------------------
+# Precompressed files
+# -------------------------
+def _fresh_sibling(path, encoding):
+    sibling = path + SUFFIXES[encoding]
+    try:
+        return sibling if os.path.getmtime(sibling) >= os.path.getmtime(path) else None
+    except OSError:
+        return None
+
+
+def send_precompressed(directory, filename, **kwargs):
+    """send_from_directory, but serves an up-to-date .br/.gz sibling when the client accepts it."""
+    path = safe_join(directory, filename)
+    mimetype = mimetypes.guess_type(filename)[0]
+    if path and os.path.isfile(path) and mimetype in COMPRESSIBLE_TYPES:
+        encoding = negotiate([e for e in _encodings() if _fresh_sibling(path, e)])
+        if encoding:
+            response = send_from_directory(directory, filename + SUFFIXES[encoding],
+                                           mimetype=mimetype, **kwargs)
+            response.headers["Content-Encoding"] = encoding
+            response.vary.add("Accept-Encoding")
+            return response
+    return send_from_directory(directory, filename, **kwargs)
+
+
+def precompress_file(path, best=True):
+    """Writes .gz (and .br) siblings. Returns {encoding: bytes}.
+
+    best=False is for files generated during a request (the heatmap): brotli
+    quality 11 takes seconds on a few MB, quality 9 is ~25x faster.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    sizes = {"identity": len(data)}
+    if len(data) < COMPRESS_MIN_SIZE:
+        return sizes
+    for encoding in _encodings():
+        sibling = path + SUFFIXES[encoding]
+        if _fresh_sibling(path, encoding):
+            sizes[encoding] = os.path.getsize(sibling)
+            continue
+        tmp = sibling + ".tmp"
+        with open(tmp, "wb") as f:
+            if encoding == "br":
+                f.write(compress(data, encoding, level=11 if best else 9))
+            else:
+                f.write(compress(data, encoding, level=9 if best else GZIP_LEVEL))
+        os.replace(tmp, sibling)
+        sizes[encoding] = os.path.getsize(sibling)
+    return sizes
+
+
+def build(dirs=None):
+    """Precompresses every text asset under the static asset folders. Returns {path: sizes}."""
+    results = {}
+    for root_dir in dirs or PRECOMPRESS_DIRS:
+        for root, _, files in os.walk(root_dir):
+            for name in files:
+                if os.path.splitext(name)[1] in PRECOMPRESS_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    results[path] = precompress_file(path)
+    return results
+
+
+def init_app(app):
+    """Compresses dynamic responses and serves precompressed static files."""
+    app.after_request(compress_response)
+    app.view_functions["static"] = lambda filename: send_precompressed(app.static_folder, filename)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(bandwidth_kbps=1500, rounds=5):
+    """Prints bytes on the wire and time saved per page, per encoding.
+
+    Transfer time is modelled at `bandwidth_kbps` (a typical rural 3G link);
+    server time is what the app spends producing and compressing the body.
+    """
+    import time
+
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["role"] = "admin"
+    build()
+    pages = ["/admin_dashboard", "/admin/export/complaints.csv", "/admin/charts/data.json",
+             "/admin_charts/odisha_heatmap.html", "/static/css/admin_styles.css", "/static/css/style.css"]
+    print(f"{'page':<36} {'encoding':>8} {'bytes':>9} {'server ms':>9} {'transfer ms':>11} {'saved ms':>9}")
+    for page in pages:
+        baseline = None
+        for encoding in ["identity"] + _encodings():
+            start = time.perf_counter()
+            for _ in range(rounds):
+                response = client.get(page, headers={"Accept-Encoding": encoding})
+                body = response.get_data()
+            server_ms = (time.perf_counter() - start) / rounds * 1000
+            if response.status_code != 200:
+                print(f"{page:<36} skipped ({response.status_code})")
+                break
+            transfer_ms = len(body) * 8 / bandwidth_kbps
+            if baseline is None:
+                baseline = server_ms + transfer_ms
+            print(f"{page:<36} {response.headers.get('Content-Encoding', 'identity'):>8} {len(body):>9} "
+                  f"{server_ms:>9.1f} {transfer_ms:>11.1f} {baseline - server_ms - transfer_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    elif "--build" in sys.argv:
+        for path, sizes in build().items():
+            detail = ", ".join(f"{enc} {size}" for enc, size in sizes.items())
+            print(f"  {os.path.relpath(path, BASE_DIR)}: {detail}")
+        print("✅ Precompressed assets written")
+    else:
+        print("Usage: python compression.py --build | --bench")
@@ -3,7 +3,9 @@
 import sqlite3
 import os
 from datetime import datetime
-import pandas as pd
+
+import complaint_cache
+from resolution_stats import record_resolution
 
 # --- Constants ---
 DB_NAME = "civic.db"
@@ -22,10 +24,18 @@ def get_db_connection():
 
 # --- All Database Helper Functions ---
 
-def get_db_df():
-    """Fetches all complaints into a pandas DataFrame for chart generation."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT * FROM complaints", conn)
+def get_db_df(include_archive=False):
+    """Fetches all complaints into a pandas DataFrame for chart generation.
+
+    Reads from the analytics snapshot (see snapshot.py), not the live database.
+    Archived complaints (see archive.py) are only included when asked for.
+    """
+    import pandas as pd  # deferred: only analytics callers pay for pandas
+    from archive import complaints_source
+    from snapshot import get_snapshot_connection
+
+    conn = get_snapshot_connection()
+    df = pd.read_sql_query(f"SELECT * FROM {complaints_source(conn, include_archive)}", conn)
     conn.close()
     return df
 
@@ -37,23 +47,88 @@ def get_all_complaints():
     return complaints
 
 def get_user_complaints(user_phone):
-    """Fetches all complaints for a specific user."""
+    """Fetches all complaints for a specific user, archived ones included."""
+    from archive import complaints_source  # imported here: archive imports this module
+
     conn = get_db_connection()
-    complaints = conn.execute("SELECT * FROM complaints WHERE user_phone = ? ORDER BY id DESC", (user_phone,)).fetchall()
+    complaints = conn.execute(f"SELECT * FROM {complaints_source(conn, True)} WHERE user_phone = ? ORDER BY id DESC",
+                              (user_phone,)).fetchall()
     conn.close()
     return complaints
 
-def get_complaint_by_id(cid):
-    """Fetches a single complaint by its ID."""
+def get_complaint_by_id(cid, include_archive=False):
+    """Fetches a single complaint by its ID (optionally looking in the archive too).
+
+    Live rows are served from complaint_cache; the write helpers below invalidate it.
+    """
+    from archive import complaints_source  # imported here: archive imports this module
+
+    try:
+        cid = int(cid)
+    except (TypeError, ValueError):
+        return None
+    complaint = complaint_cache.get(cid)
+    if complaint is not None:
+        return complaint
+
+    row_version = complaint_cache.version(cid)
     conn = get_db_connection()
     complaint = conn.execute("SELECT * FROM complaints WHERE id = ?", (cid,)).fetchone()
+    if complaint is not None:
+        complaint_cache.put(cid, complaint, row_version)
+    elif include_archive:
+        complaint = conn.execute(f"SELECT * FROM {complaints_source(conn, True)} WHERE id = ?", (cid,)).fetchone()
     conn.close()
     return complaint
 
+def get_duplicates(cid):
+    """Fetches the complaints that were linked to `cid` as near-duplicates, archived ones included."""
+    from archive import complaints_source  # imported here: archive imports this module
+
+    conn = get_db_connection()
+    complaints = conn.execute(f"SELECT * FROM {complaints_source(conn, True)} WHERE duplicate_of = ? ORDER BY id",
+                              (cid,)).fetchall()
+    conn.close()
+    return complaints
+
+def record_status_change(conn, cid, old_status, new_status, changed_at=None):
+    """Appends a row to status_history on the caller's connection (same transaction).
+
+    Also moves the complaint between hotspot grid buckets if it has coordinates.
+    """
+    from hotspots import on_status_change  # imported here: hotspots imports this module
+
+    changed_at = changed_at or datetime.utcnow().isoformat()
+    conn.execute("INSERT INTO status_history (complaint_id, old_status, new_status, changed_at) VALUES (?, ?, ?, ?)",
+                 (cid, old_status, new_status, changed_at))
+    on_status_change(conn, cid, old_status, new_status, changed_at)
+
+def _is_resolved(status):
+    return (status or "").strip().lower() == "resolved"
+
 def update_complaint_status(cid, status, admin_proof_filename=None):
-    """Updates the status and optionally the admin proof for a complaint."""
+    """Updates the status and optionally the admin proof for a complaint.
+
+    The transition is logged to status_history, and the first transition to
+    Resolved feeds the resolution-time sketches.
+    """
     conn = get_db_connection()
     updated_at = datetime.utcnow().isoformat()
+    current = conn.execute("SELECT status, department, district FROM complaints WHERE id = ?", (cid,)).fetchone()
+    if current and current["status"] != status:
+        record_status_change(conn, cid, current["status"], status, updated_at)
+        if _is_resolved(status) and not _is_resolved(current["status"]):
+            submitted = conn.execute("""SELECT changed_at FROM status_history
+                                        WHERE complaint_id = ? AND old_status IS NULL
+                                        ORDER BY id LIMIT 1""", (cid,)).fetchone()
+            resolved_before = conn.execute("""SELECT COUNT(*) FROM status_history
+                                              WHERE complaint_id = ? AND lower(trim(new_status)) = 'resolved'""",
+                                           (cid,)).fetchone()[0] > 1
+            # Only the first resolution counts; complaints filed before history existed are skipped
+            if submitted and not resolved_before:
+                seconds = (datetime.fromisoformat(updated_at)
+                           - datetime.fromisoformat(submitted["changed_at"])).total_seconds()
+                record_resolution(conn, current["department"], current["district"], seconds)
     if admin_proof_filename:
         conn.execute("UPDATE complaints SET status = ?, admin_proof = ?, updated_at = ? WHERE id = ?",
                      (status, admin_proof_filename, updated_at, cid))
@@ -62,6 +137,7 @@ def update_complaint_status(cid, status, admin_proof_filename=None):
                      (status, updated_at, cid))
     conn.commit()
     conn.close()
+    complaint_cache.invalidate(int(cid))
 
 def update_complaint_proof(cid, proof_filename):
     """Updates the user's proof filename for a specific complaint."""
@@ -69,6 +145,14 @@ def update_complaint_proof(cid, proof_filename):
     conn.execute("UPDATE complaints SET proof = ? WHERE id = ?", (proof_filename, cid))
     conn.commit()
     conn.close()
+    complaint_cache.invalidate(int(cid))
+def update_complaint_voice_proof(cid, voice_filename):
+    """Updates the voice complaint filename for a specific complaint."""
+    conn = get_db_connection()
+    conn.execute("UPDATE complaints SET voice_proof = ? WHERE id = ?", (voice_filename, cid))
+    conn.commit()
+    conn.close()
+    complaint_cache.invalidate(int(cid))
 # database.py (add this new function at the end)
 
 def update_complaint_details(cid, data):
@@ -77,12 +161,13 @@ def update_complaint_details(cid, data):
     conn.execute("""
         UPDATE complaints 
         SET name = ?, phone = ?, district = ?, block = ?, gp = ?, 
-            village = ?, landmark = ?, pincode = ?, department = ?, complaint = ?
+            village = ?, landmark = ?, pincode = ?, department = ?, complaint = ?, updated_at = ?
         WHERE id = ?
     """, (
         data.get('name'), data.get('phone'), data.get('district'), data.get('block'),
         data.get('gp'), data.get('village'), data.get('landmark'), data.get('pincode'),
-        data.get('department'), data.get('complaint'), cid
+        data.get('department'), data.get('complaint'), datetime.utcnow().isoformat(), cid
     ))
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+    complaint_cache.invalidate(int(cid))
\ No newline at end of file
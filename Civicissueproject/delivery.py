@@ -0,0 +1,125 @@
+# delivery.py
+# Sends uploaded proofs, voice complaints and admin charts.
+#
+# Routes do their authorization check and then call send_media(). How the
+# bytes leave the server depends on FILE_DELIVERY:
+#
+#   direct      Flask streams the file itself (default). Range requests get
+#               206 Partial Content, so seeking in a voice complaint only
+#               fetches the bytes it needs, and ETag/Last-Modified give 304s.
+#   x-accel     nginx: the response is just an X-Accel-Redirect header and the
+#               proxy sends the file, freeing the gunicorn worker at once.
+#   x-sendfile  Apache/lighttpd mod_xsendfile: same idea with X-Sendfile.
+#
+# nginx config for x-accel (one internal location per folder key):
+#
+#   location /protected/uploads/      { internal; alias /srv/civic/static/uploads/; }
+#   location /protected/admin_proofs/ { internal; alias /srv/civic/static/admin_proofs/; }
+#   location /protected/admin_charts/ { internal; alias /srv/civic/static/admin_charts/; }
+#   location /protected/reports/      { internal; alias /srv/civic/reports/; }
+#
+# If nginx also serves /static/ itself, keep uploads out of it; they may only
+# leave through /media/uploads, which checks who is asking:
+#
+#   location /static/uploads/         { return 404; }
+#
+#   python delivery.py --bench        # worker time per large download, per mode
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import abort, make_response
+from werkzeug.security import safe_join
+
+from compression import send_precompressed
+
+# --- Config ---
+FILE_DELIVERY = os.environ.get("FILE_DELIVERY", "direct")  # direct | x-accel | x-sendfile
+X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX", "/protected")
+MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", 3600))  # seconds; uploads never change in place
+
+
+def send_media(folder_key, directory, filename, mode=None, max_age=MEDIA_MAX_AGE):
+    """Sends `directory/filename` after the caller has authorized the request.
+
+    `folder_key` names the directory in the proxy's internal location
+    (/protected/<folder_key>/...).
+    """
+    mode = mode or FILE_DELIVERY
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if mode in ("x-accel", "x-sendfile"):
+        # Empty body: the proxy reads the file and handles Range/caching itself
+        response = make_response("")
+        if mode == "x-accel":
+            response.headers["X-Accel-Redirect"] = f"{X_ACCEL_PREFIX}/{folder_key}/{quote(filename)}"
+        else:
+            response.headers["X-Sendfile"] = os.path.abspath(path)
+        response.headers["Content-Type"] = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response.headers["Cache-Control"] = f"private, max-age={max_age}"
+        return response
+
+    # conditional=True: Range -> 206, If-None-Match/If-Modified-Since -> 304;
+    # text files (e.g. the heatmap) go out as their precompressed .br/.gz sibling
+    response = send_precompressed(directory, filename, conditional=True, max_age=max_age)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.cache_control.public = False  # proofs are per-user, keep them out of shared caches
+    response.cache_control.private = True
+    return response
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(size_mb=50, rounds=5, client_mbps=20):
+    """Prints how long a worker is held per download of a large file in each mode.
+
+    The worker is busy until the response body has been handed over. Locally
+    that is a memory copy; behind a real network the body drains at the
+    client's speed, so the direct modes are also shown at `client_mbps`.
+    """
+    import tempfile
+    import time
+
+    from flask import Flask
+
+    app = Flask(__name__)
+    with tempfile.TemporaryDirectory() as folder:
+        filename = "voice_bench.webm"
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(os.urandom(size_mb * 1024 * 1024))
+
+        @app.route("/media/<mode>")
+        def media(mode):
+            return send_media("uploads", folder, filename, mode=mode)
+
+        client = app.test_client()
+        cases = [("direct", "full file", {}),
+                 ("direct", "1 MB seek", {"Range": f"bytes={size_mb // 2 * 1024 * 1024}-{(size_mb // 2 + 1) * 1024 * 1024 - 1}"}),
+                 ("x-accel", "full file", {}),
+                 ("x-sendfile", "full file", {})]
+        network_s = size_mb * 8 / client_mbps
+        print(f"{size_mb} MB file, {rounds} rounds, client at {client_mbps} Mbit/s")
+        for mode, label, headers in cases:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                response = client.get(f"/media/{mode}", headers=headers, buffered=False)
+                sent = sum(len(chunk) for chunk in response.response)  # drain like the WSGI server would
+                response.close()
+            local_ms = (time.perf_counter() - start) / rounds * 1000
+            line = f"{mode:>10} {label:>9}: {response.status_code} {sent / 1048576:6.1f} MB, worker {local_ms:7.1f} ms locally"
+            if sent:
+                line += f", ~{sent * 8 / 1048576 / client_mbps:5.1f} s at the client's speed"
+            print(line)
+        print(f"(a full direct download holds a worker ~{network_s:.0f} s per client; "
+              f"x-accel/x-sendfile hand the bytes to the proxy)")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        print("Usage: python delivery.py --bench")
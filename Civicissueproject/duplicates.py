@@ -0,0 +1,226 @@
+# duplicates.py
+# Near-duplicate detection for new complaints.
+#
+# Open, canonical complaints are kept in an in-memory MinHash/LSH index,
+# partitioned by (district, village, department). A new complaint is hashed
+# once, its LSH band keys are looked up in the matching partition, and only
+# those few candidates are compared, so a check never scans the table.
+#
+# The index is per process. warm() loads the open originals once, from a
+# background thread the app starts on a worker's first request, so no citizen
+# waits for the table to be hashed. After that, each lookup first pulls
+# complaints with an id above the highest one this process has seen, plus
+# those whose updated_at moved since (two index range scans), so complaints
+# filed, edited or promoted through other gunicorn workers are picked up.
+# Matched candidates are re-checked against the database before a link is made.
+#
+# When an original is deleted, on_delete() promotes its oldest duplicate to be
+# the new original and points the other duplicates at it.
+import re
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database import get_db_connection
+
+# --- Tuning ---
+NUM_PERM = 64
+BANDS, ROWS = 16, 4                 # 16 x 4 = 64; ~50% similarity to become a candidate
+DUPLICATE_THRESHOLD = 0.6           # estimated Jaccard to call it a duplicate
+SHINGLE_WORDS = 2
+CLOSED_STATUSES = ("resolved", "rejected")
+CATCH_UP_OVERLAP = 10               # seconds of updated_at re-read, for writes that commit late
+
+_PRIME = 4294967311                 # smallest prime above 2**32
+_rng = np.random.default_rng(20250901)
+_A = _rng.integers(1, 2 ** 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint64)
+
+_lock = threading.Lock()
+_signatures = {}                    # cid -> (partition, signature)
+_buckets = {}                       # partition -> [ {band_key: set(cid)} per band ]
+_max_seen_id = 0
+_max_seen_updated_at = ""
+_warmed = False
+
+
+# -------------------------
+# Hashing
+# -------------------------
+def _partition(district, village, department):
+    return tuple((v or "").strip().lower() for v in (district, village, department))
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < SHINGLE_WORDS:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint64 values) of a complaint's word shingles."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    x = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def _band_keys(sig):
+    return [sig[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+# -------------------------
+# Index maintenance
+# -------------------------
+def _add(cid, partition, sig):
+    bands = _buckets.setdefault(partition, [dict() for _ in range(BANDS)])
+    for band, key in zip(bands, _band_keys(sig)):
+        band.setdefault(key, set()).add(cid)
+    _signatures[cid] = (partition, sig)
+
+
+def _remove(cid):
+    entry = _signatures.pop(cid, None)
+    if not entry:
+        return
+    partition, sig = entry
+    for band, key in zip(_buckets.get(partition, []), _band_keys(sig)):
+        band.get(key, set()).discard(cid)
+
+
+def forget(cid):
+    """Drops a complaint from the index (resolved, rejected, deleted or edited)."""
+    with _lock:
+        _remove(cid)
+
+
+def _reindex(row):
+    _remove(row["id"])
+    if row["duplicate_of"] or (row["status"] or "pending").strip().lower() in CLOSED_STATUSES:
+        return
+    sig = signature(row["complaint"])
+    if sig is not None:
+        _add(row["id"], _partition(row["district"], row["village"], row["department"]), sig)
+
+
+def _warm(conn):
+    """Loads every open original (only those) and sets the watermarks. Call with _lock held."""
+    global _max_seen_id, _max_seen_updated_at, _warmed
+    if _warmed:
+        return
+    # Watermarks first: rows changed while loading are re-read by the next catch-up
+    max_id, max_updated_at = conn.execute("SELECT MAX(id), MAX(updated_at) FROM complaints").fetchone()
+    closed = ", ".join("?" * len(CLOSED_STATUSES))
+    rows = conn.execute(f"""SELECT id, district, village, department, complaint, status, duplicate_of
+                            FROM complaints
+                            WHERE duplicate_of IS NULL
+                                  AND lower(trim(COALESCE(status, 'pending'))) NOT IN ({closed})""",
+                        CLOSED_STATUSES).fetchall()
+    for row in rows:
+        _reindex(row)
+    _max_seen_id = max(_max_seen_id, max_id or 0)
+    _max_seen_updated_at = max(_max_seen_updated_at, max_updated_at or "")
+    _warmed = True
+
+
+def warm():
+    """Builds this process's index, if it isn't built yet. Meant for a background thread."""
+    conn = get_db_connection()
+    try:
+        with _lock:
+            _warm(conn)
+    finally:
+        conn.close()
+
+
+def _catch_up(conn):
+    """Re-reads complaints filed or updated since this process last looked."""
+    global _max_seen_id, _max_seen_updated_at
+    if not _warmed:
+        _warm(conn)  # a lookup got here before warm(): same filtered load
+        return
+    since = _max_seen_updated_at
+    try:
+        since = (datetime.fromisoformat(since) - timedelta(seconds=CATCH_UP_OVERLAP)).isoformat()
+    except ValueError:
+        pass  # nothing seen yet, or a legacy non-ISO value
+    cols = "id, district, village, department, complaint, status, duplicate_of, updated_at"
+    rows = conn.execute(f"""SELECT {cols} FROM complaints WHERE id > ?
+                            UNION SELECT {cols} FROM complaints WHERE updated_at > ?
+                            ORDER BY id""", (_max_seen_id, since)).fetchall()
+    for row in rows:
+        _max_seen_id = max(_max_seen_id, row["id"])
+        _max_seen_updated_at = max(_max_seen_updated_at, row["updated_at"] or "")
+        _reindex(row)
+
+
+def index_complaint(cid, district, village, department, text):
+    """Adds a freshly inserted canonical complaint to this process's index.
+
+    The id watermark is left alone: ids below `cid` may have come from other
+    workers and still need to be caught up. Re-adding `cid` later is harmless.
+    """
+    sig = signature(text)
+    if sig is not None:
+        with _lock:
+            _add(cid, _partition(district, village, department), sig)
+
+
+def on_delete(conn, cid):
+    """Re-links the duplicates of a complaint being deleted, in the caller's transaction.
+
+    The oldest duplicate becomes the new original and the others point at it.
+    Its updated_at is bumped so every worker's index picks it up. Returns the
+    ids whose rows changed.
+    """
+    children = [row[0] for row in conn.execute(
+        "SELECT id FROM complaints WHERE duplicate_of = ? ORDER BY id", (cid,))]
+    if children:
+        now = datetime.utcnow().isoformat()
+        conn.execute("UPDATE complaints SET duplicate_of = NULL, updated_at = ? WHERE id = ?", (now, children[0]))
+        conn.execute("UPDATE complaints SET duplicate_of = ? WHERE duplicate_of = ?", (children[0], cid))
+    return children
+
+
+# -------------------------
+# Lookup
+# -------------------------
+def find_duplicate(district, village, department, text):
+    """Returns the id of an open complaint this one duplicates, or None."""
+    sig = signature(text)
+    if sig is None:
+        return None
+    partition = _partition(district, village, department)
+
+    conn = get_db_connection()
+    try:
+        with _lock:
+            _catch_up(conn)
+            bands = _buckets.get(partition)
+            if not bands:
+                return None
+            candidates = set()
+            for band, key in zip(bands, _band_keys(sig)):
+                candidates |= band.get(key, set())
+            scored = sorted(((similarity(sig, _signatures[c][1]), c) for c in candidates), reverse=True)
+
+        for score, cid in scored:
+            if score < DUPLICATE_THRESHOLD:
+                break
+            # Another worker may have closed it since we indexed it
+            row = conn.execute("SELECT status, duplicate_of FROM complaints WHERE id = ?", (cid,)).fetchone()
+            if row and not row["duplicate_of"] and (row["status"] or "pending").strip().lower() not in CLOSED_STATUSES:
+                return cid
+            forget(cid)
+        return None
+    finally:
+        conn.close()
@@ -1,7 +1,11 @@
-from flask import Blueprint, jsonify, request, session, make_response
-from database import get_complaint_by_id, update_complaint_details, get_db_df
-import pandas as pd
+from flask import Blueprint, jsonify, request, session, make_response, redirect, url_for
+from database import get_complaint_by_id, get_db_connection, update_complaint_details, get_db_df
+from resolution_stats import SCOPES, quantiles
+from snapshot import snapshot_taken_at
+import triage
 import io
+import re
+import os
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 admin_features_bp = Blueprint('admin_features', __name__)
@@ -17,8 +21,8 @@ def export_complaints_csv():
         return "Unauthorized", 401
 
     try:
-        # Get all complaints as a pandas DataFrame
-        df = get_db_df()
+        # Get all complaints as a pandas DataFrame (?archive=1 adds archived ones)
+        df = get_db_df(include_archive=request.args.get('archive') == '1')
 
         if df.empty:
             return "No complaints to export.", 404
@@ -32,6 +36,7 @@ def export_complaints_csv():
         response = make_response(output.getvalue())
         response.headers["Content-Disposition"] = "attachment; filename=complaints.csv"
         response.headers["Content-type"] = "text/csv"
+        response.headers["X-Data-As-Of"] = snapshot_taken_at() or ""
         
         return response
 
@@ -40,6 +45,35 @@ def export_complaints_csv():
         return "Failed to generate CSV.", 500
 
 
+@api_bp.route('/reverse_geocode')
+def reverse_geocode_location():
+    """Resolves ?lat=&lon= to a state/district so the report form can pre-select it."""
+    if 'user' not in session:
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    from geocoder import district_key, resolve_location
+    lat, lon, state, district = resolve_location(request.args.get('lat'), request.args.get('lon'))
+    if lat is None:
+        return jsonify({'success': False, 'error': 'Invalid coordinates'}), 400
+    if not district:
+        return jsonify({'success': False, 'error': 'Location is outside the known boundaries'}), 404
+    return jsonify({'success': True, 'state': state, 'district': district,
+                    'district_key': district_key(district)})
+
+
+@api_bp.route('/boundaries')
+@api_bp.route('/boundaries/<state>')
+def state_boundaries(state=None):
+    """States index, or a redirect to the state's preprocessed GeoJSON for ?zoom=N."""
+    import boundaries
+    if state is None:
+        return jsonify(boundaries.load_index())
+    if boundaries.state_info(state) is None:
+        return jsonify({'success': False, 'error': 'Unknown state'}), 404
+    level = boundaries.level_for_zoom(request.args.get('zoom', 7, type=int))
+    return redirect(url_for('static', filename=f"boundaries/{boundaries.slugify(state)}/{level}.geojson"))
+
+
 @api_bp.route('/complaint/<int:cid>', methods=['PUT'])
 def update_complaint(cid):
     # Security Check 1: User must be logged in
@@ -62,5 +96,154 @@ def update_complaint(cid):
 
     # Call the database function to update the complaint
     update_complaint_details(cid, data)
+    triage.enqueue(cid, data.get('complaint') or complaint['complaint'])  # text may have changed
+
+    # Re-index under the new text and location; duplicates aren't indexed
+    import duplicates
+    duplicates.forget(cid)
+    if not complaint['duplicate_of']:
+        duplicates.index_complaint(cid, data.get('district'), data.get('village'),
+                                   data.get('department'), data.get('complaint'))
     
     return jsonify({'success': True, 'message': 'Complaint updated successfully'})
+
+
+# --- Drill-down / time-bucketed reports from the Parquet analytics store ---
+def _months_arg():
+    months = request.args.get('months')
+    return [m.strip() for m in months.split(',') if m.strip()] if months else None
+
+
+@admin_features_bp.route('/admin/analytics/drilldown')
+def analytics_drilldown():
+    """Status counts one level below ?district=&block=&gp= (optionally ?months=2025-08,2025-09)."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    import analytics_store
+    analytics_store.sync_in_background()
+    table = analytics_store.drilldown(request.args.get('district'), request.args.get('block'),
+                                      request.args.get('gp'), months=_months_arg())
+    rows = {str(place): {status: int(n) for status, n in counts.items()}
+            for place, counts in table.to_dict(orient='index').items()}
+    return jsonify({'success': True, 'rows': rows})
+
+
+@admin_features_bp.route('/admin/analytics/timeseries')
+def analytics_timeseries():
+    """Complaint counts per ?freq=D|W|M bucket, optionally filtered by department/district."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    freq = request.args.get('freq', 'D').upper()
+    if freq not in ('D', 'W', 'M'):
+        return jsonify({'success': False, 'error': 'freq must be D, W or M'}), 400
+
+    import analytics_store
+    analytics_store.sync_in_background()
+    series = analytics_store.time_series(freq, months=_months_arg(),
+                                         department=request.args.get('department'),
+                                         district=request.args.get('district'))
+    return jsonify({'success': True, 'series': {str(k): int(v) for k, v in series.items()}})
+
+
+@admin_features_bp.route('/admin/analytics/resolution_times')
+def analytics_resolution_times():
+    """p50/p90 hours-to-resolve per ?scope=department|district|all."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    scope = request.args.get('scope', 'department')
+    if scope not in SCOPES:
+        return jsonify({'success': False, 'error': f"scope must be one of {', '.join(SCOPES)}"}), 400
+
+    conn = get_db_connection()
+    stats = quantiles(conn, scope)
+    conn.close()
+    return jsonify({'success': True, 'scope': scope, 'unit': 'hours', 'stats': stats})
+
+
+@admin_features_bp.route('/admin/charts/data.json')
+def chart_data():
+    """Compact JSON series for every dashboard chart, drawn client-side by minicharts.js."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    from charts import chart_series
+    return jsonify({'success': True, 'data_as_of': snapshot_taken_at(),
+                    'charts': chart_series(get_db_df())})
+
+
+@admin_features_bp.route('/admin/hotspots.json')
+@admin_features_bp.route('/admin/hotspots.geojson')
+def hotspots_api():
+    """Anomalous grid cells (?window_days=7&baseline_days=28&min_count=5&min_score=3)."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    import hotspots
+    try:
+        spots = hotspots.detect(window_days=int(request.args.get('window_days', 7)),
+                                baseline_days=int(request.args.get('baseline_days', 28)),
+                                min_count=int(request.args.get('min_count', 5)),
+                                min_score=float(request.args.get('min_score', 3.0)))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid parameter'}), 400
+
+    if request.path.endswith('.geojson'):
+        return jsonify(hotspots.to_geojson(spots))
+    return jsonify({'success': True, 'cell_deg': hotspots.CELL_DEG, 'hotspots': spots})
+
+
+@admin_features_bp.route('/admin/cache_stats')
+def cache_stats():
+    """Hit ratios of the complaint row cache and the /community page cache. Counters are per worker process."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    import community
+    import complaint_cache
+    return jsonify({'success': True, 'pid': os.getpid(), 'complaint_cache': complaint_cache.stats(),
+                    'community_cache': community.stats()})
+
+
+@admin_features_bp.route('/admin/reports/generate', methods=['POST'])
+def generate_reports():
+    """Renders the monthly district reports (month=YYYY-MM, default last month; force=1 re-renders all)."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    import reports
+    data = request.get_json(silent=True) or request.form
+    try:
+        summary = reports.generate(data.get('month') or None, force=str(data.get('force')) == '1')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'month must look like 2025-09'}), 400
+    return jsonify({'success': True, **summary})
+
+
+@admin_features_bp.route('/admin/reports/<month>')
+def report_index(month):
+    """The month's district reports with links to the current version of each."""
+    if session.get("role") != "admin":
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    import reports
+    manifest = reports.load_manifest(month) if re.fullmatch(r'\d{4}-\d{2}', month) else None
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'No reports for that month yet'}), 404
+    for entry in manifest['districts'].values():
+        entry['url'] = url_for('admin_features.report_file', month=month, filename=entry['html'])
+    return jsonify({'success': True, **manifest})
+
+
+@admin_features_bp.route('/admin/reports/<month>/<path:filename>')
+def report_file(month, filename):
+    if session.get("role") != "admin":
+        return "Unauthorized", 401
+
+    import reports
+    from delivery import send_media
+    if not re.fullmatch(r'\d{4}-\d{2}', month):
+        return "Not found", 404
+    return send_media(f"reports/{month}", os.path.join(reports.REPORT_FOLDER, month), filename)
@@ -0,0 +1,55 @@
+# file_locks.py
+# Exclusive locks on an open file, shared between processes, on Linux and
+# Windows alike.
+#
+# POSIX uses flock(). Windows has no flock, so msvcrt.locking() locks a
+# single byte at LOCK_OFFSET instead. That byte lies past any data these
+# files hold in practice, and the lock never stands in the way of reading,
+# writing or memory-mapping the file itself. Either way the lock is released
+# by unlock(), by closing the file, or when the process dies.
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import time
+
+# msvcrt.locking works from the current position, which the C runtime reads
+# as a 32-bit offset
+LOCK_OFFSET = 2 ** 31 - 2
+RETRY_INTERVAL = 0.01  # seconds between attempts of a blocking lock on Windows
+
+
+def _windows_locking(f, mode):
+    position = f.tell()
+    f.seek(LOCK_OFFSET)
+    try:
+        msvcrt.locking(f.fileno(), mode, 1)
+    finally:
+        f.seek(position)
+
+
+def lock(f, blocking=True):
+    """Locks the open file `f`. With blocking=False, returns False at once if someone else holds it."""
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    while True:
+        try:
+            _windows_locking(f, msvcrt.LK_NBLCK)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(RETRY_INTERVAL)
+
+
+def unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        _windows_locking(f, msvcrt.LK_UNLCK)
@@ -0,0 +1,142 @@
+# geocoder.py
+# Offline reverse geocoder: (lat, lon) -> (state, district) against the GADM
+# level-2 polygons in data/gadm41_IND_2.shp.
+#
+# The polygons are loaded once per process into a shapely STRtree and prepared,
+# so a lookup is a bounding-box query that returns one or two candidates
+# followed by a prepared point-in-polygon test (microseconds, not a scan of
+# all ~600 districts). reverse_geocode_many() does the same for whole NumPy
+# arrays of points, which is what the backfill uses.
+#
+#   python geocoder.py --backfill     # fill geo_district for complaints with coordinates
+import os
+import threading
+
+import numpy as np
+import shapely
+
+import complaint_cache
+from database import get_db_connection
+from piu import DISTRICT_MAP
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHAPEFILE = os.path.join(BASE_DIR, "data", "gadm41_IND_2.shp")
+BACKFILL_BATCH = 50000
+
+# Shapefile district name (lowercase) -> the key used by the report form / DB
+NAME_TO_DB_KEY = {v.lower(): k for k, v in DISTRICT_MAP.items()}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_index(path=SHAPEFILE):
+    """Reads the boundaries and builds the spatial index: (tree, geoms, states, districts)."""
+    import geopandas as gpd
+
+    gdf = gpd.read_file(path, columns=["NAME_1", "NAME_2"])
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    shapely.prepare(geoms)
+    return (shapely.STRtree(geoms), geoms,
+            gdf["NAME_1"].to_numpy(dtype=object), gdf["NAME_2"].to_numpy(dtype=object))
+
+
+def _get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = load_index()
+    return _index
+
+
+def valid_coordinates(lat, lon):
+    """Parses lat/lon (strings or numbers); returns (lat, lon) floats or None."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def reverse_geocode(lat, lon):
+    """Returns (state, district) for a point, or None if it is outside every polygon."""
+    tree, geoms, states, districts = _get_index()
+    for i in tree.query(shapely.Point(lon, lat)):
+        if shapely.contains_xy(geoms[i], lon, lat):
+            return states[i], districts[i]
+    return None
+
+
+def reverse_geocode_many(lats, lons):
+    """Vectorized lookup; returns (states, districts) object arrays with None for misses."""
+    tree, geoms, states, districts = _get_index()
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    point_idx, poly_idx = tree.query(shapely.points(lons, lats))
+    hit = shapely.contains_xy(geoms[poly_idx], lons[point_idx], lats[point_idx])
+    point_idx, poly_idx = point_idx[hit], poly_idx[hit]
+    # A point on a shared border matches twice; keep the first polygon
+    point_idx, first = np.unique(point_idx, return_index=True)
+    poly_idx = poly_idx[first]
+
+    out_states = np.full(len(lats), None, dtype=object)
+    out_districts = np.full(len(lats), None, dtype=object)
+    out_states[point_idx] = states[poly_idx]
+    out_districts[point_idx] = districts[poly_idx]
+    return out_states, out_districts
+
+
+def resolve_location(lat, lon):
+    """Validates a submitted position and resolves it.
+
+    Returns (lat, lon, state, district); all None for invalid input, and the
+    state/district are None if the point can't be placed or the boundary file
+    is unavailable (the complaint is still accepted).
+    """
+    coords = valid_coordinates(lat, lon)
+    if not coords:
+        return None, None, None, None
+    try:
+        state, district = reverse_geocode(*coords) or (None, None)
+    except Exception as e:
+        print(f"Reverse geocoding failed: {e}")
+        state = district = None
+    return coords[0], coords[1], state, district
+
+
+def district_key(district):
+    """Maps a shapefile district name to the report form's district value."""
+    return NAME_TO_DB_KEY.get((district or "").lower(), (district or "").lower())
+
+
+def backfill(batch_size=BACKFILL_BATCH):
+    """Resolves geo_state/geo_district for every complaint with coordinates but no district yet."""
+    conn = get_db_connection()
+    last_id, updated = 0, 0
+    while True:
+        rows = conn.execute("""SELECT id, latitude, longitude FROM complaints
+                               WHERE id > ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+                                     AND geo_district IS NULL
+                               ORDER BY id LIMIT ?""", (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        ids = [r["id"] for r in rows]
+        states, districts = reverse_geocode_many([r["latitude"] for r in rows], [r["longitude"] for r in rows])
+        conn.executemany("UPDATE complaints SET geo_state = ?, geo_district = ? WHERE id = ?",
+                         [(s, d, i) for i, s, d in zip(ids, states, districts) if d is not None])
+        conn.commit()
+        complaint_cache.invalidate(*ids)
+        updated += sum(d is not None for d in districts)
+        last_id = ids[-1]
+    conn.close()
+    return updated
+
+
+if __name__ == "__main__":
+    import sys
+    if "--backfill" in sys.argv:
+        print(f"✅ {backfill()} complaints assigned a district")
+    else:
+        print("Usage: python geocoder.py --backfill")
@@ -0,0 +1,191 @@
+# hotspots.py
+# Grid-based hotspot detection over complaint GPS positions.
+#
+# Complaints are binned into a fixed lat/lon grid (HOTSPOT_CELL_DEG, ~1.1 km
+# at 0.01°). Two tables are kept up to date incrementally, in the same
+# transaction as the complaint write (see database.record_status_change):
+#
+#   hotspot_counts (cell, department, status) -> current complaint count
+#   hotspot_daily  (cell, day)                -> complaints filed that day
+#
+# A cell is a hotspot when the complaints filed in the last `window_days`
+# clearly exceed what its own rolling baseline (the `baseline_days` before
+# that) predicts. rebuild() recomputes both tables from scratch with NumPy
+# binning, so it stays fast for millions of points.
+#
+#   python hotspots.py --rebuild
+import math
+import os
+from datetime import datetime, timedelta
+
+from database import get_db_connection
+
+CELL_DEG = float(os.environ.get("HOTSPOT_CELL_DEG", 0.01))
+_COLS = int(math.ceil(360 / CELL_DEG))
+
+
+def create_tables(conn):
+    """Creates the hotspot count tables (called from init_db)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS hotspot_counts (
+                     cell INTEGER NOT NULL, department TEXT NOT NULL, status TEXT NOT NULL,
+                     count INTEGER NOT NULL, PRIMARY KEY (cell, department, status)
+                 )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS hotspot_daily (
+                     cell INTEGER NOT NULL, day TEXT NOT NULL, count INTEGER NOT NULL,
+                     PRIMARY KEY (cell, day)
+                 )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hotspot_daily_day ON hotspot_daily (day)")
+
+
+# -------------------------
+# Grid
+# -------------------------
+def cell_of(lat, lon):
+    """Grid cell id for one point."""
+    # Same float ops as cells_of() so a point always lands in the same cell
+    return math.floor((lat + 90) / CELL_DEG) * _COLS + math.floor((lon + 180) / CELL_DEG)
+
+
+def cells_of(lats, lons):
+    """Vectorized cell ids for NumPy arrays of points."""
+    import numpy as np
+    rows = np.floor((np.asarray(lats, dtype=float) + 90) / CELL_DEG).astype(np.int64)
+    cols = np.floor((np.asarray(lons, dtype=float) + 180) / CELL_DEG).astype(np.int64)
+    return rows * _COLS + cols
+
+
+def cell_bounds(cell):
+    """(south, west, north, east) of a cell."""
+    row, col = divmod(int(cell), _COLS)
+    south, west = row * CELL_DEG - 90, col * CELL_DEG - 180
+    return tuple(round(v, 6) for v in (south, west, south + CELL_DEG, west + CELL_DEG))
+
+
+# -------------------------
+# Incremental maintenance
+# -------------------------
+def _bump(conn, cell, department, status, delta):
+    conn.execute('''INSERT INTO hotspot_counts (cell, department, status, count) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (cell, department, status) DO UPDATE SET count = count + excluded.count''',
+                 (cell, department or "Unknown", status or "Pending", delta))
+
+
+def on_status_change(conn, cid, old_status, new_status, changed_at):
+    """Moves a complaint between status buckets; old_status None means newly filed."""
+    row = conn.execute("SELECT latitude, longitude, department FROM complaints WHERE id = ?", (cid,)).fetchone()
+    if not row or row[0] is None or row[1] is None:
+        return
+    cell = cell_of(row[0], row[1])
+    if old_status is None:
+        conn.execute('''INSERT INTO hotspot_daily (cell, day, count) VALUES (?, ?, 1)
+                        ON CONFLICT (cell, day) DO UPDATE SET count = count + 1''',
+                     (cell, changed_at[:10]))
+    else:
+        _bump(conn, cell, row[2], old_status, -1)
+    _bump(conn, cell, row[2], new_status, 1)
+
+
+def on_delete(conn, cid):
+    """Removes a complaint's current bucket before the row is deleted."""
+    row = conn.execute("SELECT latitude, longitude, department, status FROM complaints WHERE id = ?",
+                       (cid,)).fetchone()
+    if row and row[0] is not None and row[1] is not None:
+        _bump(conn, cell_of(row[0], row[1]), row[2], row[3], -1)
+
+
+def rebuild():
+    """Recomputes both tables from all complaints with coordinates. Returns points binned."""
+    import pandas as pd
+
+    conn = get_db_connection()
+    df = pd.read_sql_query("""SELECT c.latitude, c.longitude, c.department, c.status,
+                                     COALESCE(h.changed_at, c.updated_at) AS filed_at
+                              FROM complaints c
+                              LEFT JOIN status_history h ON h.complaint_id = c.id AND h.old_status IS NULL
+                              WHERE c.latitude IS NOT NULL AND c.longitude IS NOT NULL""", conn)
+    df["cell"] = cells_of(df["latitude"].to_numpy(), df["longitude"].to_numpy())
+    df["department"] = df["department"].fillna("Unknown")
+    df["status"] = df["status"].fillna("Pending")
+    counts = df.groupby(["cell", "department", "status"]).size().reset_index(name="count")
+    daily = (df.dropna(subset=["filed_at"]).assign(day=lambda d: d["filed_at"].str[:10])
+               .groupby(["cell", "day"]).size().reset_index(name="count"))
+
+    conn.execute("DELETE FROM hotspot_counts")
+    conn.execute("DELETE FROM hotspot_daily")
+    conn.executemany("INSERT INTO hotspot_counts VALUES (?, ?, ?, ?)",
+                     counts.astype(object).itertuples(index=False, name=None))
+    conn.executemany("INSERT INTO hotspot_daily VALUES (?, ?, ?)",
+                     daily.astype(object).itertuples(index=False, name=None))
+    conn.commit()
+    conn.close()
+    return len(df)
+
+
+# -------------------------
+# Detection
+# -------------------------
+def detect(window_days=7, baseline_days=28, min_count=5, min_score=3.0, today=None):
+    """Returns cells whose recent complaints exceed their rolling baseline, highest score first.
+
+    score = (recent - expected) / sqrt(expected), with expected scaled from the
+    baseline period (and floored at 1 so brand-new clusters still register).
+    """
+    import numpy as np
+
+    today = today or datetime.utcnow().date()
+    window_start = (today - timedelta(days=window_days - 1)).isoformat()
+    baseline_start = (today - timedelta(days=window_days + baseline_days - 1)).isoformat()
+
+    conn = get_db_connection()
+    rows = conn.execute("SELECT cell, day >= ?, count FROM hotspot_daily WHERE day >= ?",
+                        (window_start, baseline_start)).fetchall()
+    if not rows:
+        conn.close()
+        return []
+    cells, in_window, counts = (np.array(col) for col in zip(*rows))
+    uniq, inv = np.unique(cells.astype(np.int64), return_inverse=True)
+    recent = np.bincount(inv, weights=counts * in_window, minlength=len(uniq))
+    baseline = np.bincount(inv, weights=counts * (1 - in_window), minlength=len(uniq))
+    expected = np.maximum(baseline * window_days / baseline_days, 1.0)
+    score = (recent - expected) / np.sqrt(expected)
+
+    hot = np.flatnonzero((recent >= min_count) & (score >= min_score))
+    hot = hot[np.argsort(-score[hot])]
+
+    spots = []
+    for i in hot:
+        cell = int(uniq[i])
+        by_dept = {}
+        for dept, status, n in conn.execute("SELECT department, status, count FROM hotspot_counts "
+                                            "WHERE cell = ? AND count > 0", (cell,)):
+            by_dept.setdefault(dept, {})[status] = n
+        south, west, north, east = cell_bounds(cell)
+        spots.append({"cell": cell, "bounds": [south, west, north, east],
+                      "center": [round((south + north) / 2, 6), round((west + east) / 2, 6)],
+                      "recent": int(recent[i]), "expected": round(float(expected[i]), 2),
+                      "score": round(float(score[i]), 2), "by_department": by_dept})
+    conn.close()
+    return spots
+
+
+def to_geojson(spots):
+    """FeatureCollection of hotspot cells (polygons) for folium or any web map."""
+    features = []
+    for s in spots:
+        south, west, north, east = s["bounds"]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [[[west, south], [east, south], [east, north],
+                                                             [west, north], [west, south]]]},
+            "properties": {k: s[k] for k in ("cell", "recent", "expected", "score")},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--rebuild" in sys.argv:
+        print(f"✅ {rebuild()} complaints binned into {CELL_DEG}° cells")
+    for s in detect():
+        print(f"cell {s['cell']} @ {s['center']}: {s['recent']} recent vs {s['expected']} expected "
+              f"(score {s['score']})")
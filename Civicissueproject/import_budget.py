@@ -0,0 +1,71 @@
+# import_budget.py
+# Cold-start check for worker boot. Runs `python -X importtime -c "import app"`
+# in a fresh interpreter and fails if the analytics/geo stack gets pulled in at
+# import time again, or if the total import time goes over budget.
+#
+#   python import_budget.py              # default budget
+#   python import_budget.py --budget-ms 400
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Top-level packages that must only be imported on first use.
+FORBIDDEN_MODULES = ("pandas", "matplotlib", "geopandas", "folium", "shapely", "numpy")
+DEFAULT_BUDGET_MS = 600
+
+
+def measure_imports(module="app"):
+    """Imports `module` in a clean interpreter and returns {module: cumulative_us}."""
+    env = dict(os.environ, PYTHONPATH=BASE_DIR)
+    # Run from a scratch directory so init_db() doesn't touch the real civic.db
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _self_us, cumulative_us, name = [p.strip() for p in line.split(":", 1)[1].split("|")]
+        timings[name] = int(cumulative_us)
+    return timings
+
+
+def check_budget(module="app", budget_ms=DEFAULT_BUDGET_MS):
+    """Returns a list of problems; an empty list means the budget holds."""
+    timings = measure_imports(module)
+    problems = []
+
+    loaded = sorted({name.split(".")[0] for name in timings} & set(FORBIDDEN_MODULES))
+    for name in loaded:
+        problems.append(f"{name} is imported at startup (should load lazily)")
+
+    total_ms = timings.get(module, 0) / 1000
+    if total_ms > budget_ms:
+        problems.append(f"import {module} took {total_ms:.0f} ms (budget {budget_ms} ms)")
+
+    print(f"import {module}: {total_ms:.0f} ms cumulative, {len(timings)} modules")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check worker import-time budget.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+
+    problems = check_budget(args.module, args.budget_ms)
+    for p in problems:
+        print("❌", p)
+    if problems:
+        sys.exit(1)
+    print("✅ Import budget OK")
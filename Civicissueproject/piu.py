@@ -1,9 +1,7 @@
 import os
-import sqlite3
-import folium
-import geopandas as gpd
-from folium.plugins import HeatMap
-import matplotlib.pyplot as plt
+
+# folium, geopandas and matplotlib are imported inside the functions that use
+# them, so importing this module (e.g. for DISTRICT_MAP) stays cheap.
 
 # -------------------------
 # Database Path (absolute)
@@ -11,9 +9,6 @@ import matplotlib.pyplot as plt
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = os.path.abspath(os.path.join(BASE_DIR, "..", "civic.db"))
 
-print("🔎 Using DB file:", DB_NAME)
-
-
 # -------------------------
 # District Mapping (DB → Shapefile)
 # -------------------------
@@ -55,13 +50,18 @@ DISTRICT_MAP = {
 # DB Connection
 # -------------------------
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    # Reporting queries read the analytics snapshot, never the live file
+    from snapshot import get_snapshot_connection
+    return get_snapshot_connection(DB_NAME)
 
 
 # -------------------------
 # Generate Charts
 # -------------------------
 def generate_charts():
+    # Shares the thread-safe Figure/Agg renderer (and atomic write) with charts.py
+    from charts import render_chart
+
     charts = {}
 
     conn = get_connection()
@@ -71,12 +71,9 @@ def generate_charts():
     rows = cur.fetchall()
     statuses, counts = zip(*rows) if rows else ([], [])
 
-    plt.figure(figsize=(6, 4))
-    plt.bar(statuses, counts)
-    plt.title("Complaints by Status")
     path = os.path.join(BASE_DIR, "static", "admin_charts", "status_bar.png")
-    plt.savefig(path)
-    plt.close()
+    render_chart({"kind": "bar", "title": "Complaints by Status",
+                  "labels": [str(s) for s in statuses], "values": list(counts), "figsize": (6, 4)}, path)
     charts["status_bar"] = "admin_charts/status_bar.png"
 
     conn.close()
@@ -84,17 +81,122 @@ def generate_charts():
 
 
 # -------------------------
-# Generate Odisha Heatmap
-# -------------------------
-# -------------------------
-# Generate Odisha Heatmap
+# Generate State Heatmap
 # -------------------------
-def generate_odisha_heatmap():
+def _zoom_loader(coarse, url, stats, empty_fill):
+    """Map element that swaps the embedded coarse layer for finer boundaries as the map zooms in.
+
+    The medium / fine GeoJSON is fetched from `url` (/api/boundaries/<state>)
+    the first time its zoom range is reached and styled from `stats`
+    ({NAME_2: [pending, in progress, resolved, total, fill colour]}).
+    """
+    from branca.element import MacroElement
+    from jinja2 import Template
+    import boundaries
+
+    element = MacroElement()
+    element._name = "ZoomLoader"
+    element.coarse, element.url, element.stats, element.empty_fill = coarse, url, stats, empty_fill
+    element.level_at = [boundaries.level_for_zoom(zoom) for zoom in range(19)]  # Leaflet zooms 0-18
+    element._template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var url = {{ this.url|tojson }};
+            var stats = {{ this.stats|tojson }};
+            var levelAt = {{ this.level_at|tojson }};
+            var layers = {coarse: {{ this.coarse.get_name() }}}, loading = {};
+            function escape(text) {
+                return String(text).replace(/[&<>"']/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; });
+            }
+            function style(feature) {
+                var s = stats[feature.properties.NAME_2];
+                return {fillColor: s ? s[4] : {{ this.empty_fill|tojson }}, fillOpacity: 0.7,
+                        color: "black", weight: 1, opacity: 0.8};
+            }
+            function tooltip(feature) {
+                var s = stats[feature.properties.NAME_2] || [0, 0, 0, 0];
+                return "<b>District:</b> " + escape(feature.properties.NAME_2) + "<br>Pending: " + s[0] +
+                       "<br>In Progress: " + s[1] + "<br>Resolved: " + s[2] + "<br>Total: " + s[3];
+            }
+            function load(level, zoom) {
+                if (loading[level]) return;
+                loading[level] = true;
+                fetch(url + "?zoom=" + zoom).then(function (response) {
+                    if (!response.ok) throw new Error(response.status);
+                    return response.json();
+                }).then(function (data) {
+                    layers[level] = L.geoJson(data, {style: style, onEachFeature: function (feature, layer) {
+                        layer.bindTooltip(tooltip(feature), {sticky: true});
+                    }});
+                    show();
+                }).catch(function () { loading[level] = false; });  // stay coarse, retry on the next zoom
+            }
+            function show() {
+                var zoom = Math.max(0, Math.min(levelAt.length - 1, Math.round(map.getZoom())));
+                var want = levelAt[zoom];
+                if (!layers[want]) {
+                    load(want, zoom);
+                    want = "coarse";  // until the finer one arrives
+                }
+                for (var level in layers) {
+                    if (level !== want && map.hasLayer(layers[level])) map.removeLayer(layers[level]);
+                }
+                if (!map.hasLayer(layers[want])) {
+                    map.addLayer(layers[want]);
+                    layers[want].bringToBack();  // keep the hotspot cells on top
+                }
+            }
+            map.on("zoomend", show);
+            show();
+        })();
+        {% endmacro %}
+    """)
+    return element
+
+
+def _heatmap_current(out_path):
+    """True if the saved heatmap is newer than both the snapshot and the boundaries it was drawn from."""
+    from snapshot import ensure_fresh, snapshot_path
+    import boundaries
+
+    ensure_fresh(DB_NAME)
+    try:
+        drawn = os.path.getmtime(out_path)
+        return drawn >= max(os.path.getmtime(snapshot_path(DB_NAME)),
+                            os.path.getmtime(os.path.join(boundaries.OUT_DIR, "index.json")))
+    except OSError:
+        return False
+
+
+def generate_state_heatmap(state="Odisha", zoom_start=7, force=False):
+    """District choropleth for any state, drawn from the preprocessed boundaries.
+
+    The saved map is reused until the snapshot is refreshed (or force=True).
+    Returns None if the boundaries haven't been built (python boundaries.py).
+    """
+    import folium
+    import boundaries
+
+    if not boundaries.load_index():
+        return None  # the dashboard is shown without the map
+    info = boundaries.state_info(state)
+    if info is None:
+        raise ValueError(f"No boundaries for state: {state}")
+
+    filename = f"{boundaries.slugify(state)}_heatmap.html"
+    out_path = os.path.join(BASE_DIR, "static", "admin_charts", filename)
+    if not force and _heatmap_current(out_path):
+        return f"admin_charts/{filename}"
+
     conn = get_connection()
     cur = conn.cursor()
 
-    # Get complaints grouped by district + status
-    cur.execute("SELECT district, status, COUNT(*) FROM complaints GROUP BY district, status;")
+    # Get complaints grouped by district + status. Complaints with GPS use the
+    # polygon-resolved district, so a misspelled district no longer drops out.
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(complaints)")}
+    district_expr = "COALESCE(geo_district, district)" if "geo_district" in columns else "district"
+    cur.execute(f"SELECT {district_expr}, status, COUNT(*) FROM complaints GROUP BY 1, 2;")
     rows = cur.fetchall()
     conn.close()
 
@@ -106,61 +208,44 @@ def generate_odisha_heatmap():
         "resolved": "Resolved"
     }
 
-    # Build dictionary {district: {"Pending": x, "InProgress": y, "Resolved": z}}
+    # Build dictionary {NAME_2: {"Pending": x, "InProgress": y, "Resolved": z}}
     district_stats = {}
     for d, s, c in rows:
-        d = d.lower().strip()
-        norm_status = STATUS_MAP.get(s.lower().strip(), None)
-        if not norm_status:
-            continue  # ignore unknown statuses
-        if d not in district_stats:
-            district_stats[d] = {"Pending": 0, "InProgress": 0, "Resolved": 0}
-        district_stats[d][norm_status] += c   # ✅ counts will now match correctly
-
-    print("📊 District complaint stats:", district_stats)
-
-    # Load Odisha shapefile
-    shp_path = os.path.join(BASE_DIR, "data", "gadm41_IND_2.shp")
-    gdf = gpd.read_file(shp_path)
-    odisha_gdf = gdf[gdf["NAME_1"] == "Odisha"]
-
-    # Create DB-mapped column
-    odisha_gdf["db_key"] = odisha_gdf["NAME_2"].apply(
-        lambda n: next((k for k, v in DISTRICT_MAP.items() if v.lower() == n.lower()), None)
-    )
-
-    # Add complaint counts
-    odisha_gdf["pending"] = odisha_gdf["db_key"].apply(
-        lambda d: district_stats.get(d, {}).get("Pending", 0) if d else 0
-    )
-    odisha_gdf["inprogress"] = odisha_gdf["db_key"].apply(
-        lambda d: district_stats.get(d, {}).get("InProgress", 0) if d else 0
-    )
-    odisha_gdf["resolved"] = odisha_gdf["db_key"].apply(
-        lambda d: district_stats.get(d, {}).get("Resolved", 0) if d else 0
-    )
-    odisha_gdf["total"] = odisha_gdf["pending"] + odisha_gdf["inprogress"] + odisha_gdf["resolved"]
+        name = boundaries.canonical_district(state, d)  # any known spelling → shapefile NAME_2
+        norm_status = STATUS_MAP.get((s or "").lower().strip(), None)
+        if not name or not norm_status:
+            continue  # other state, or unknown status
+        if name not in district_stats:
+            district_stats[name] = {"Pending": 0, "InProgress": 0, "Resolved": 0}
+        district_stats[name][norm_status] += c
+
+    print(f"📊 {info['name']} district complaint stats:", district_stats)
 
     # Map
-    m = folium.Map(location=[20.9517, 85.0985], zoom_start=7, tiles="cartodbpositron")
-
-    # Choropleth
-    folium.Choropleth(
-        geo_data=odisha_gdf,
-        data=odisha_gdf,
-        columns=["NAME_2", "total"],
-        key_on="feature.properties.NAME_2",
-        fill_color="YlOrRd",
-        fill_opacity=0.7,
-        line_opacity=0.8,
-        legend_name="Total Complaints",
-    ).add_to(m)
+    m = folium.Map(location=info["center"], zoom_start=zoom_start, tiles="cartodbpositron")
+
+    import branca.colormap
+    most = max((sum(stats.values()) for stats in district_stats.values()), default=0)
+    colormap = branca.colormap.linear.YlOrRd_09.scale(0, most or 1).to_step(6)
+    colormap.caption = "Total Complaints"
+    colormap.add_to(m)
+
+    # Only the coarse boundaries are embedded, with the counts merged in; finer
+    # ones are fetched by _zoom_loader when the admin zooms in
+    features = []
+    for feature in boundaries.load_geojson(state, "coarse")["features"]:
+        stats = district_stats.get(feature["properties"]["NAME_2"], {})
+        props = dict(feature["properties"], pending=stats.get("Pending", 0),
+                     inprogress=stats.get("InProgress", 0), resolved=stats.get("Resolved", 0))
+        props["total"] = props["pending"] + props["inprogress"] + props["resolved"]
+        features.append(dict(feature, properties=props))
 
-    # Tooltip
-    folium.GeoJson(
-        odisha_gdf,
-        name="District Stats",
-        style_function=lambda x: {"color": "black", "weight": 1, "fillOpacity": 0},
+    coarse = folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Districts",
+        control=False,
+        style_function=lambda x: {"fillColor": colormap(x["properties"]["total"]), "fillOpacity": 0.7,
+                                  "color": "black", "weight": 1, "opacity": 0.8},
         tooltip=folium.GeoJsonTooltip(
             fields=["NAME_2", "pending", "inprogress", "resolved", "total"],
             aliases=["District:", "Pending:", "In Progress:", "Resolved:", "Total:"],
@@ -168,12 +253,39 @@ def generate_odisha_heatmap():
             sticky=True,
         ),
     ).add_to(m)
+    stats = {name: [c["Pending"], c["InProgress"], c["Resolved"], sum(c.values()), colormap(sum(c.values()))]
+             for name, c in district_stats.items()}
+    _zoom_loader(coarse, f"/api/boundaries/{boundaries.slugify(state)}", stats, colormap(0)).add_to(m)
 
-    # Save
-    out_path = os.path.join(BASE_DIR, "static", "admin_charts", "odisha_heatmap.html")
-    m.save(out_path)
+    # Hotspot cells (complaints with GPS clustering above their baseline)
+    try:
+        import hotspots
+        spots = hotspots.detect()
+    except Exception as e:
+        print(f"Hotspot detection skipped: {e}")
+        spots = []
+    if spots:
+        folium.GeoJson(
+            hotspots.to_geojson(spots),
+            name="Hotspots",
+            style_function=lambda x: {"color": "#b10026", "weight": 1, "fillColor": "#e31a1c", "fillOpacity": 0.6},
+            tooltip=folium.GeoJsonTooltip(fields=["recent", "expected", "score"],
+                                          aliases=["Last 7 days:", "Expected:", "Score:"]),
+        ).add_to(m)
+        folium.LayerControl().add_to(m)
+
+    # Save (renamed into place: other workers may be serving the previous one)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    m.save(tmp_path)
+    os.replace(tmp_path, out_path)
+    from compression import precompress_file
+    precompress_file(out_path, best=False)  # served as .br/.gz without per-request compression
     print(f"✅ Heatmap with tooltips saved at {out_path}")
-    return "admin_charts/odisha_heatmap.html"
+    return f"admin_charts/{filename}"
+
+
+def generate_odisha_heatmap(force=False):
+    return generate_state_heatmap("Odisha", force=force)
 
 
 
@@ -181,7 +293,8 @@ def generate_odisha_heatmap():
 # Run as script
 # -------------------------
 if __name__ == "__main__":
+    print("🔎 Using DB file:", DB_NAME)
     print("Generating charts + Odisha heatmap...")
     generate_charts()
-    generate_odisha_heatmap()
+    generate_odisha_heatmap(force=True)
     print("✅ Done. Check static/admin_charts/")
@@ -0,0 +1,286 @@
+# ratelimit.py
+# Admission control: token buckets and a concurrency cap, shared by every
+# gunicorn worker.
+#
+# Rate limits: each limited endpoint has one or more token buckets, keyed by
+# the caller's IP, phone number or session. A request takes one token from
+# each of its buckets; buckets refill at burst/period tokens per second. If any
+# bucket is empty the request is answered at once with 429 and Retry-After,
+# before the view parses a form or touches civic.db. Bucket state lives in a
+# small SQLite file (WAL, no fsync; losing it in a crash only resets limits)
+# so a caller can't dodge a limit by landing on another worker.
+#
+# Concurrency cap: the expensive admin pages (dashboard, CSV export, report
+# generation) share EXPENSIVE_CONCURRENCY slots across all workers. A slot is
+# a lock on a lock file (see file_locks.py), so a worker that dies releases
+# its slot with it. When all slots are busy the request gets a 429 instead of
+# tying up one more worker.
+#
+# If the limiter's own store fails, requests are let through.
+#
+#   python ratelimit.py --bench       # citizen tail latency while an abuser floods the app
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import g, jsonify, make_response, request, session
+
+import file_locks
+
+# --- Config ---
+ENABLED = os.environ.get("RATELIMIT_ENABLED", "1") == "1"
+TRUST_PROXY = os.environ.get("RATELIMIT_TRUST_PROXY", "0") == "1"  # key on X-Forwarded-For behind nginx
+EXPENSIVE_CONCURRENCY = int(os.environ.get("EXPENSIVE_CONCURRENCY", 2))
+
+# endpoint -> [(key, burst, period_seconds)]
+RULES = {
+    "user_login": [("ip", 20, 60), ("phone", 5, 300)],
+    "admin_login": [("ip", 10, 60)],
+    "signup": [("ip", 5, 600)],
+    "chatbot.chat": [("session", 30, 60), ("ip", 120, 60)],
+    "submit_complaint": [("phone", 5, 600), ("ip", 20, 600)],
+    "uploads.resumable_create": [("phone", 10, 600)],
+}
+EXPENSIVE_ENDPOINTS = {"admin_dashboard", "admin_features.export_complaints_csv",
+                       "admin_features.generate_reports"}
+
+_local = threading.local()
+
+
+def _state_dir():
+    from database import DB_NAME  # imported here so a changed DB_NAME is honoured
+    root, _ = os.path.splitext(DB_NAME)
+    path = os.environ.get("RATELIMIT_DIR", f"{root}_ratelimit")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _connection():
+    # One connection per thread, reopened after a fork
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(os.path.join(_state_dir(), "buckets.db"), timeout=1, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""CREATE TABLE IF NOT EXISTS buckets (
+                            key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)""")
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+# -------------------------
+# Token buckets
+# -------------------------
+def take(buckets, now=None):
+    """Takes one token from each of `buckets` [(key, burst, period)], all or nothing.
+
+    Returns 0 when admitted, else the seconds until every bucket has a token.
+    """
+    now = time.time() if now is None else now
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        marks = ", ".join("?" * len(buckets))
+        stored = dict(((k, (t, u)) for k, t, u in conn.execute(
+            f"SELECT key, tokens, updated FROM buckets WHERE key IN ({marks})", [b[0] for b in buckets])))
+        levels, wait = [], 0.0
+        for key, burst, period in buckets:
+            rate = burst / period
+            tokens, updated = stored.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            levels.append((key, tokens - 1))
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+        if not wait:
+            conn.executemany("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                             [(key, tokens, now) for key, tokens in levels])
+        if random.random() < 0.001:
+            # A bucket untouched for a day is full again; drop it
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+
+def _caller_ip():
+    if TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "unknown"
+
+
+def _caller_key(kind):
+    if kind == "ip":
+        return f"ip:{_caller_ip()}"
+    if kind == "phone":
+        phone = session.get("user")
+        if not phone and request.mimetype == "application/x-www-form-urlencoded":
+            phone = request.form.get("phone")  # login form; never parse a multipart upload here
+        return f"phone:{phone}" if phone else None
+    if "rl_id" not in session:
+        session["rl_id"] = uuid.uuid4().hex
+    return f"session:{session['rl_id']}"
+
+
+# -------------------------
+# Concurrency cap
+# -------------------------
+def acquire_slot(slots=None):
+    """An open, locked slot file, or None when all `slots` are busy. Close it to release."""
+    slots = EXPENSIVE_CONCURRENCY if slots is None else slots
+    folder = _state_dir()
+    for i in random.sample(range(slots), slots):
+        f = open(os.path.join(folder, f"expensive-{i}.lock"), "a")
+        if file_locks.lock(f, blocking=False):
+            return f
+        f.close()
+    return None
+
+
+def _release_slot(exc=None):
+    slot = g.pop("admission_slot", None)
+    if slot is not None:
+        slot.close()
+
+
+# -------------------------
+# Flask hooks
+# -------------------------
+def _too_many(retry_after, message):
+    retry_after = max(1, math.ceil(retry_after))
+    if request.is_json or request.accept_mimetypes.best == "application/json":
+        # `response` is what the chat widget shows
+        response = jsonify({"success": False, "error": message, "response": message, "retry_after": retry_after})
+    else:
+        response = make_response(message)
+        response.mimetype = "text/plain"
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def admit():
+    """before_request hook: 429 for callers over their limit or when expensive pages are saturated."""
+    if not ENABLED or request.endpoint is None:
+        return None
+    rules = RULES.get(request.endpoint)
+    if rules and request.method != "GET":
+        buckets = []
+        for kind, burst, period in rules:
+            key = _caller_key(kind)
+            if key:
+                buckets.append((f"{request.endpoint}|{key}", burst, period))
+        try:
+            wait = take(buckets)
+        except sqlite3.Error:
+            wait = 0  # fail open
+        if wait:
+            return _too_many(wait, "Too many requests, please wait a moment and try again.")
+
+    # Only admins reach these views; anyone else is turned away by the view
+    # itself and must not use up a slot
+    if request.endpoint in EXPENSIVE_ENDPOINTS and session.get("role") == "admin":
+        slot = acquire_slot()
+        if slot is None:
+            return _too_many(2, "The server is busy with other reports, please retry in a few seconds.")
+        g.admission_slot = slot
+    return None
+
+
+def init_app(app):
+    app.before_request(admit)
+    app.teardown_request(_release_slot)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(workers=4, abusers=12, seconds=5):
+    """Prints a citizen's latency while abusers flood login, chat and the CSV export.
+
+    Gunicorn's fixed worker pool is modelled by `workers` threads taking
+    requests from one FIFO queue (the listen backlog). Latency is measured
+    from arrival, so it includes the time spent queued behind the abusers.
+    """
+    import queue
+    import statistics
+
+    import app as civic
+    import ratelimit  # the module app registered, not __main__
+
+    backlog = queue.Queue()
+
+    def worker():
+        for job in iter(backlog.get, None):
+            job()
+
+    def call(client, method, path, ip, **kwargs):
+        done, result = threading.Event(), {}
+
+        def job():
+            response = getattr(client, method)(path, environ_base={"REMOTE_ADDR": ip}, **kwargs)
+            response.get_data()
+            result["status"] = response.status_code
+            done.set()
+
+        start = time.perf_counter()
+        backlog.put(job)
+        done.wait()
+        return result["status"], time.perf_counter() - start
+
+    def abuser(n, stop, counts):
+        # Scripts don't keep cookies, except the stolen admin session hammering the export
+        client = civic.app.test_client(use_cookies=n % 3 == 2)
+        if n % 3 == 2:
+            with client.session_transaction() as sess:
+                sess["role"] = "admin"
+        method, path, kwargs = [("post", "/user_login", {"data": {"phone": "9999999999", "password": "guess"}}),
+                                ("post", "/chat", {"json": {"message": "hi"}}),
+                                ("get", "/admin/export/complaints.csv", {})][n % 3]
+        while not stop.is_set():
+            status, _ = call(client, method, path, "203.0.113.7", **kwargs)
+            counts[status] = counts.get(status, 0) + 1
+
+    for enabled in (False, True):
+        ratelimit.ENABLED = enabled
+        for name in os.listdir(_state_dir()):
+            if name.startswith("buckets.db"):
+                os.remove(os.path.join(_state_dir(), name))
+
+        pool = [threading.Thread(target=worker) for _ in range(workers)]
+        stop, counts = threading.Event(), {}
+        threads = [threading.Thread(target=abuser, args=(n, stop, counts)) for n in range(abusers)]
+        for t in pool + threads:
+            t.start()
+        citizen = civic.app.test_client()
+        latencies = []
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            _, elapsed = call(citizen, "post", "/chat", "198.51.100.20", json={"message": "hi"})
+            latencies.append(elapsed * 1000)
+            time.sleep(0.05)
+        stop.set()
+        for t in threads:
+            t.join()
+        for _ in pool:
+            backlog.put(None)
+        for t in pool:
+            t.join()
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"limiter {'on ' if enabled else 'off'}: citizen p50 {statistics.median(latencies):7.1f} ms, "
+              f"p99 {p99:7.1f} ms over {len(latencies)} requests; abuser responses {dict(sorted(counts.items()))}")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        print("Usage: python ratelimit.py --bench")
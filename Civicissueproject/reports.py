@@ -0,0 +1,267 @@
+# reports.py
+# Monthly per-district complaint reports for officials.
+#
+# One report per district with activity in the month: counts, a department x
+# status table, a six-month trend chart, the overdue list and resolution
+# times. All districts are aggregated in a single pass over the analytics
+# snapshot (archived complaints included). Each district's numbers become a
+# plain dict, and only the HTML + chart rendering is spread over a process
+# pool.
+#
+# Output is versioned: every run writes into REPORT_FOLDER/<month>/<run>/ and
+# REPORT_FOLDER/<month>/manifest.json points at the current file per
+# district. A district whose numbers (and the template) are the same as in
+# the last run keeps its old file and is not rendered again. Earlier runs are
+# left in place, so what was sent out for a month can always be looked up.
+#
+#   python reports.py                       # last month, changed districts only
+#   python reports.py --month 2025-09       # a given month
+#   python reports.py --month 2025-09 --force
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import file_locks
+from archive import complaints_source
+from snapshot import get_snapshot_connection
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
+TEMPLATE_NAME = "district_report.html"
+
+# --- Config ---
+REPORT_FOLDER = os.environ.get("REPORT_FOLDER", os.path.join(BASE_DIR, "reports"))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", min(4, os.cpu_count() or 1)))
+OVERDUE_DAYS = int(os.environ.get("REPORT_OVERDUE_DAYS", 30))
+TREND_MONTHS = 6
+MAX_OVERDUE_ROWS = 50
+
+_jinja = None
+
+
+def month_bounds(month=None):
+    """(start, end) datetimes of "YYYY-MM" (default: last month). Raises ValueError."""
+    if month is None:
+        start = (datetime.utcnow().replace(day=1) - timedelta(days=1)).replace(day=1)
+    else:
+        start = datetime.strptime(month, "%Y-%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _slug(key):
+    return "".join(ch if ch.isalnum() else "-" for ch in key).strip("-") or "unknown"
+
+
+# -------------------------
+# Aggregation (one pass, parent process)
+# -------------------------
+def _history_source(conn):
+    attached = any(row[1] == "archive" for row in conn.execute("PRAGMA database_list"))
+    if not attached:
+        return "status_history"
+    cols = "complaint_id, old_status, new_status, changed_at"
+    return (f"(SELECT {cols} FROM main.status_history "
+            f"UNION ALL SELECT {cols} FROM archive.status_history)")
+
+
+def load_complaints(conn):
+    """One row per original (non-duplicate) complaint with filed_at / resolved_at timestamps."""
+    import pandas as pd
+
+    source = complaints_source(conn, True)  # attaches the archive when there is one
+    df = pd.read_sql_query(f"""
+        SELECT complaints.id, complaints.district, complaints.geo_district, complaints.department,
+               complaints.status, complaints.duplicate_of,
+               COALESCE(MIN(CASE WHEN h.old_status IS NULL THEN h.changed_at END),
+                        complaints.updated_at) AS filed_at,
+               COALESCE(MIN(CASE WHEN lower(trim(h.new_status)) = 'resolved' THEN h.changed_at END),
+                        CASE WHEN lower(trim(complaints.status)) = 'resolved'
+                             THEN complaints.updated_at END) AS resolved_at
+        FROM {source} LEFT JOIN {_history_source(conn)} AS h ON h.complaint_id = complaints.id
+        GROUP BY complaints.id""", conn)
+    df = df[df["duplicate_of"].isna()]  # count each issue once
+    df["district_key"] = (df["district"].fillna(df["geo_district"]).fillna("unknown")
+                          .str.strip().str.lower().replace("", "unknown"))
+    df["department"] = df["department"].fillna("Unknown")
+    df["status"] = df["status"].fillna("Pending")
+    for col in ("filed_at", "resolved_at"):
+        df[col] = pd.to_datetime(df[col], format="ISO8601", errors="coerce")
+    return df.dropna(subset=["filed_at"])  # undated legacy rows can't be placed in a month
+
+
+def district_payloads(df, start, end):
+    """{district_key: payload} of plain values for every district with activity in the month."""
+    import pandas as pd
+
+    month_label = start.strftime("%B %Y")
+    trend_starts = pd.date_range(end=start, periods=TREND_MONTHS, freq="MS")
+    payloads = {}
+    for key, d in df.groupby("district_key"):
+        filed = d[(d["filed_at"] >= start) & (d["filed_at"] < end)]
+        resolved = d[(d["resolved_at"] >= start) & (d["resolved_at"] < end)]
+        open_at_end = d[(d["filed_at"] < end) & ~(d["resolved_at"] < end)
+                        & (d["status"].str.strip().str.lower() != "rejected")]
+        if filed.empty and resolved.empty and open_at_end.empty:
+            continue
+
+        table = pd.crosstab(filed["department"], filed["status"]) if not filed.empty else pd.DataFrame()
+        hours = ((resolved["resolved_at"] - resolved["filed_at"]).dt.total_seconds() / 3600).clip(lower=0)
+        age = (end - open_at_end["filed_at"]).dt.days
+        overdue = open_at_end.assign(age_days=age)[age > OVERDUE_DAYS].sort_values("age_days", ascending=False)
+        trend = [int(((d["filed_at"] >= m) & (d["filed_at"] < m + pd.offsets.MonthBegin(1))).sum())
+                 for m in trend_starts]
+
+        payloads[key] = {
+            "key": key, "name": key.title(), "month": start.strftime("%Y-%m"), "month_label": month_label,
+            "overdue_days": OVERDUE_DAYS,
+            "summary": {"filed": len(filed), "resolved": len(resolved), "open_at_end": len(open_at_end)},
+            "dept_status": {"departments": [str(i) for i in table.index],
+                            "statuses": [str(c) for c in table.columns],
+                            "counts": [[int(v) for v in row] for row in table.to_numpy()]},
+            "trend": {"labels": [m.strftime("%b %Y") for m in trend_starts], "values": trend},
+            "resolution": {"count": len(hours),
+                           "p50_hours": round(float(hours.quantile(0.5)), 1) if len(hours) else None,
+                           "p90_hours": round(float(hours.quantile(0.9)), 1) if len(hours) else None},
+            "overdue": [{"id": int(row.id), "department": row.department, "status": row.status,
+                         "filed": row.filed_at.strftime("%d %b %Y"), "age_days": int(row.age_days)}
+                        for row in overdue.head(MAX_OVERDUE_ROWS).itertuples()],
+        }
+    return payloads
+
+
+def _template_source():
+    with open(os.path.join(TEMPLATE_DIR, TEMPLATE_NAME), "rb") as f:
+        return f.read()
+
+
+def fingerprint(payload, template_source):
+    """Changes when the district's numbers or the report template change."""
+    digest = hashlib.sha256(template_source)
+    digest.update(json.dumps(payload, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+# -------------------------
+# Rendering (pool workers)
+# -------------------------
+def render_report(payload, out_dir, generated_at):
+    """Writes <slug>.html and its trend chart into `out_dir`. Returns the HTML file name."""
+    global _jinja
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    from charts import render_chart
+
+    if _jinja is None:
+        _jinja = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape())
+    slug = _slug(payload["key"])
+    trend_image = f"{slug}_trend.png"
+    render_chart({"kind": "bar", "title": f"Complaints filed per month, {payload['name']}",
+                  "labels": payload["trend"]["labels"], "values": payload["trend"]["values"],
+                  "color": "#0a66ff", "ylabel": "Complaints", "figsize": (7, 3.5)},
+                 os.path.join(out_dir, trend_image))
+    html = _jinja.get_template(TEMPLATE_NAME).render(r=payload, trend_image=trend_image,
+                                                     generated_at=generated_at)
+    tmp = os.path.join(out_dir, f".{slug}.html.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp, os.path.join(out_dir, f"{slug}.html"))
+    return f"{slug}.html"
+
+
+# -------------------------
+# Runs
+# -------------------------
+def manifest_path(month):
+    return os.path.join(REPORT_FOLDER, month, "manifest.json")
+
+
+def load_manifest(month):
+    """The month's current manifest, or None if it was never generated."""
+    try:
+        with open(manifest_path(month)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pool_context():
+    # Never fork: inside a gunicorn worker other threads (triage, write queue,
+    # chart pool) may hold locks that a forked child would inherit held
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def generate(month=None, force=False, workers=None):
+    """Renders the month's district reports. Returns a summary dict."""
+    import time
+
+    started = time.perf_counter()
+    start, end = month_bounds(month)
+    month = start.strftime("%Y-%m")
+    month_dir = os.path.join(REPORT_FOLDER, month)
+    os.makedirs(month_dir, exist_ok=True)
+
+    with open(os.path.join(month_dir, ".lock"), "w") as lock:
+        file_locks.lock(lock)  # one run per month at a time
+
+        conn = get_snapshot_connection()
+        try:
+            payloads = district_payloads(load_complaints(conn), start, end)
+        finally:
+            conn.close()
+
+        template_source = _template_source()
+        previous_manifest = load_manifest(month) or {}
+        previous = previous_manifest.get("districts", {})
+        run = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        generated_at = datetime.utcnow().strftime("%d %b %Y %H:%M UTC")
+        districts, jobs = {}, []
+        for key, payload in sorted(payloads.items()):
+            entry = {"name": payload["name"], "fingerprint": fingerprint(payload, template_source),
+                     "summary": payload["summary"], "overdue": len(payload["overdue"])}
+            old = previous.get(key)
+            if (not force and old and old["fingerprint"] == entry["fingerprint"]
+                    and os.path.exists(os.path.join(month_dir, old["html"]))):
+                entry["html"] = old["html"]
+            else:
+                jobs.append((key, payload))
+            districts[key] = entry
+
+        if jobs:
+            run_dir = os.path.join(month_dir, run)
+            os.makedirs(run_dir, exist_ok=True)
+            workers = min(workers or REPORT_WORKERS, len(jobs))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+                    futures = [(key, pool.submit(render_report, payload, run_dir, generated_at))
+                               for key, payload in jobs]
+                    names = [(key, f.result()) for key, f in futures]
+            else:
+                names = [(key, render_report(payload, run_dir, generated_at)) for key, payload in jobs]
+            for key, name in names:
+                districts[key]["html"] = f"{run}/{name}"
+
+        manifest = {"month": month, "run": run if jobs else previous_manifest.get("run"),
+                    "districts": districts}
+        tmp = manifest_path(month) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, manifest_path(month))
+
+    return {"month": month, "run": manifest["run"], "districts": len(districts),
+            "rendered": [key for key, _ in jobs], "unchanged": len(districts) - len(jobs),
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+if __name__ == "__main__":
+    import sys
+
+    month = sys.argv[sys.argv.index("--month") + 1] if "--month" in sys.argv else None
+    summary = generate(month, force="--force" in sys.argv)
+    print(f"✅ {summary['month']}: {len(summary['rendered'])} district reports rendered, "
+          f"{summary['unchanged']} unchanged, in {summary['seconds']} s")
+    print(f"   {manifest_path(summary['month'])}")
@@ -0,0 +1,77 @@
+# resolution_stats.py
+# Resolution-time percentiles per department / district.
+#
+# Every time a complaint is first marked Resolved, its time-to-resolve (from the
+# submission row in status_history) is added to a small log-bucketed quantile
+# sketch stored in the `resolution_sketch` table (DDSketch-style: bucket i holds
+# durations in (gamma^(i-1), gamma^i], giving ~2% relative error). Reading
+# p50/p90 only touches the bucket counts, never the history table, and because
+# the sketch lives in SQLite all gunicorn workers see the same numbers.
+import math
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+SCOPES = ("all", "department", "district")
+
+
+def create_tables(conn):
+    """Creates the history and sketch tables (called from init_db)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS status_history (
+                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     complaint_id INTEGER NOT NULL, old_status TEXT, new_status TEXT NOT NULL,
+                     changed_at TEXT NOT NULL
+                 )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status_history_complaint "
+                 "ON status_history (complaint_id, id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS resolution_sketch (
+                     scope TEXT NOT NULL, key TEXT NOT NULL, bucket INTEGER NOT NULL,
+                     count INTEGER NOT NULL, PRIMARY KEY (scope, key, bucket)
+                 )''')
+
+
+def _bucket(seconds):
+    return int(math.ceil(math.log(max(seconds, 1.0)) / LOG_GAMMA))
+
+
+def _bucket_value(bucket):
+    # Midpoint (in relative terms) of (gamma^(b-1), gamma^b]
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+def _normalize(value):
+    return (value or "Unknown").strip().lower() or "unknown"
+
+
+def record_resolution(conn, department, district, seconds):
+    """Adds one resolution duration to the all/department/district sketches."""
+    bucket = _bucket(seconds)
+    for scope, key in (("all", "all"), ("department", _normalize(department)),
+                       ("district", _normalize(district))):
+        conn.execute('''INSERT INTO resolution_sketch (scope, key, bucket, count) VALUES (?, ?, ?, 1)
+                        ON CONFLICT (scope, key, bucket) DO UPDATE SET count = count + 1''',
+                     (scope, key, bucket))
+
+
+def quantiles(conn, scope="department", qs=(0.5, 0.9)):
+    """Returns {key: {"count": n, "p50": hours, "p90": hours}} for a scope."""
+    rows = conn.execute("SELECT key, bucket, count FROM resolution_sketch WHERE scope = ? "
+                        "ORDER BY key, bucket", (scope,)).fetchall()
+    sketches = {}
+    for key, bucket, count in rows:
+        sketches.setdefault(key, []).append((bucket, count))
+
+    result = {}
+    for key, buckets in sketches.items():
+        total = sum(c for _, c in buckets)
+        stats = {"count": total}
+        for q in qs:
+            rank, seen = q * (total - 1), 0
+            for bucket, count in buckets:
+                seen += count
+                if seen > rank:
+                    break
+            stats[f"p{int(q * 100)}"] = round(_bucket_value(bucket) / 3600, 1)
+        result[key] = stats
+    return result
@@ -0,0 +1,207 @@
+# resumable.py
+# Resumable, chunked uploads for proof videos and voice complaints.
+#
+# The protocol follows tus (https://tus.io) closely enough for a small client
+# (static/js/resumable.js); the routes live in uploads.py:
+#
+#   POST   /uploads/resumable        {complaint_id, kind, filename, length} -> upload id
+#   HEAD   /uploads/resumable/<id>   Upload-Offset: bytes the server already has
+#   PATCH  /uploads/resumable/<id>   Upload-Offset + chunk body (+ Upload-Checksum)
+#   DELETE /uploads/resumable/<id>   give up
+#
+# Each upload is a <id>.part file plus <id>.json metadata in PARTIAL_FOLDER.
+# A chunk is only appended at the offset the server has, under a file lock,
+# so a retried or duplicated chunk can't corrupt the file. Chunks sent with a
+# checksum are verified and dropped on mismatch or when cut short; without
+# one, whatever arrived before a dropped connection is kept and the client
+# resumes from there.
+# When the last byte arrives the file is moved into static/uploads and the
+# complaint's proof / voice_proof column is set, so a complaint can be filed
+# first and its media trickle in afterwards.
+#
+#   python resumable.py --cleanup     # delete uploads idle for RESUMABLE_ABANDON_HOURS
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+
+import file_locks
+from database import BASE_DIR, UPLOAD_FOLDER, update_complaint_proof, update_complaint_voice_proof
+
+# --- Config ---
+PARTIAL_FOLDER = os.environ.get("RESUMABLE_PARTIAL_FOLDER", os.path.join(BASE_DIR, "upload_partials"))
+MAX_SIZES = {
+    "proof": int(os.environ.get("PROOF_MAX_BYTES", 200 * 1024 * 1024)),
+    "voice": int(os.environ.get("VOICE_MAX_BYTES", 25 * 1024 * 1024)),
+}
+MAX_CHUNK_BYTES = int(os.environ.get("RESUMABLE_MAX_CHUNK_BYTES", 8 * 1024 * 1024))
+ABANDON_AFTER_HOURS = float(os.environ.get("RESUMABLE_ABANDON_HOURS", 24))
+CHECKSUMS = {"md5": hashlib.md5, "sha1": hashlib.sha1, "sha256": hashlib.sha256}
+READ_SIZE = 64 * 1024
+
+# Non-standard tus status for a chunk whose checksum doesn't match
+CHECKSUM_MISMATCH = 460
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _paths(upload_id):
+    return (os.path.join(PARTIAL_FOLDER, f"{upload_id}.part"),
+            os.path.join(PARTIAL_FOLDER, f"{upload_id}.json"))
+
+
+def create(user, complaint_id, kind, filename, length):
+    """Starts an upload. Returns (meta, None) or (None, (status, message))."""
+    if kind not in MAX_SIZES:
+        return None, (400, f"Unknown upload kind: {kind}")
+    filename = secure_filename(filename or "")
+    if not filename:
+        return None, (400, "A file name is required")
+    if not isinstance(length, int) or length <= 0:
+        return None, (400, "Upload length must be a positive number of bytes")
+    if length > MAX_SIZES[kind]:
+        return None, (413, f"{kind} files are limited to {MAX_SIZES[kind] // (1024 * 1024)} MB")
+
+    os.makedirs(PARTIAL_FOLDER, exist_ok=True)
+    meta = {"id": uuid.uuid4().hex, "user": user, "complaint_id": complaint_id, "kind": kind,
+            "filename": filename, "length": length, "created_at": time.time()}
+    part_path, meta_path = _paths(meta["id"])
+    open(part_path, "wb").close()
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+    return meta, None
+
+
+def get(upload_id):
+    """Metadata of an unfinished upload, or None."""
+    if not _ID_RE.match(upload_id or ""):
+        return None
+    try:
+        with open(_paths(upload_id)[1]) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def offset(upload_id):
+    """Bytes received so far."""
+    try:
+        return os.path.getsize(_paths(upload_id)[0])
+    except OSError:
+        return 0
+
+
+def _parse_checksum(header):
+    # "sha256 <base64 digest>"
+    algorithm, _, digest = (header or "").partition(" ")
+    if algorithm not in CHECKSUMS or not digest:
+        return None
+    try:
+        return algorithm, base64.b64decode(digest, validate=True)
+    except ValueError:
+        return None
+
+
+def append(meta, at_offset, stream, content_length, checksum_header=None):
+    """Writes one chunk at `at_offset`. Returns (new_offset, None) or (None, (status, message))."""
+    if content_length is None:
+        return None, (411, "Content-Length is required")
+    if content_length > MAX_CHUNK_BYTES:
+        return None, (413, f"Chunks are limited to {MAX_CHUNK_BYTES} bytes")
+    if at_offset + content_length > meta["length"]:
+        return None, (413, "Chunk runs past the declared upload length")
+    checksum = None
+    if checksum_header:
+        checksum = _parse_checksum(checksum_header)
+        if checksum is None:
+            return None, (400, "Unsupported Upload-Checksum")
+    digest = CHECKSUMS[checksum[0]]() if checksum else None
+
+    part_path, _ = _paths(meta["id"])
+    try:
+        f = open(part_path, "r+b")
+    except FileNotFoundError:
+        return None, (404, "Upload already finished or discarded")
+    with f:
+        if not file_locks.lock(f, blocking=False):
+            return None, (423, "Another chunk for this upload is still being written")
+        size = os.fstat(f.fileno()).st_size
+        if size != at_offset:
+            return None, (409, f"Upload-Offset mismatch, server has {size} bytes")
+
+        f.seek(at_offset)
+        received = 0
+        try:
+            while received < content_length:
+                data = stream.read(min(READ_SIZE, content_length - received))
+                if not data:
+                    break
+                f.write(data)
+                if digest:
+                    digest.update(data)
+                received += len(data)
+        except (OSError, ClientDisconnected):
+            pass  # client went away mid-chunk; keep what arrived (unless it must be verified)
+        verified = not digest or (received == content_length and digest.digest() == checksum[1])
+        if not verified:
+            f.truncate(at_offset)  # a short chunk can't be verified either
+        f.flush()
+        os.fsync(f.fileno())
+        if not verified:
+            return None, (CHECKSUM_MISMATCH, "Checksum mismatch, chunk discarded")
+        new_offset = at_offset + received
+
+    if new_offset == meta["length"]:
+        finish(meta)
+    return new_offset, None
+
+
+def finish(meta):
+    """Moves a complete upload into static/uploads and attaches it to the complaint."""
+    part_path, meta_path = _paths(meta["id"])
+    final_name = secure_filename(f"{meta['kind']}_{meta['complaint_id']}_{meta['filename']}")
+    os.replace(part_path, os.path.join(UPLOAD_FOLDER, final_name))
+    if meta["kind"] == "voice":
+        update_complaint_voice_proof(meta["complaint_id"], final_name)
+    else:
+        update_complaint_proof(meta["complaint_id"], final_name)
+    os.remove(meta_path)
+    return final_name
+
+
+def discard(upload_id):
+    """Deletes an unfinished upload."""
+    for path in _paths(upload_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def cleanup(max_age_hours=None):
+    """Deletes uploads that haven't received a chunk for `max_age_hours`. Returns uploads removed."""
+    max_age = (ABANDON_AFTER_HOURS if max_age_hours is None else max_age_hours) * 3600
+    if not os.path.isdir(PARTIAL_FOLDER):
+        return 0
+    now, removed = time.time(), 0
+    upload_ids = {os.path.splitext(name)[0] for name in os.listdir(PARTIAL_FOLDER)}
+    for upload_id in filter(_ID_RE.match, upload_ids):
+        mtimes = [os.path.getmtime(p) for p in _paths(upload_id) if os.path.exists(p)]
+        if mtimes and now - max(mtimes) > max_age:
+            discard(upload_id)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    import sys
+    if "--cleanup" in sys.argv:
+        print(f"✅ {cleanup()} abandoned uploads removed from {PARTIAL_FOLDER}")
+    else:
+        print("Usage: python resumable.py --cleanup")
@@ -0,0 +1,142 @@
+# snapshot.py
+# Read-only reporting snapshot of the live database.
+#
+# Dashboard aggregation, CSV export and the heatmap read from a copy of civic.db
+# (civic_analytics.db next to it) instead of the live file, so a long report
+# never holds a read transaction while citizens are submitting complaints.
+# The copy is refreshed with SQLite's online backup API whenever it is older
+# than ANALYTICS_MAX_STALENESS seconds. The refresh runs on a background thread,
+# and requests keep reading the existing copy meanwhile. Only the very first
+# request, with no snapshot yet, waits for one. A file lock keeps workers from
+# copying at the same time, and a failed refresh (e.g. Windows refusing to
+# replace an open file) isn't retried for RETRY_INTERVAL seconds.
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import file_locks
+from database import DB_NAME
+
+# --- Config ---
+MAX_STALENESS = int(os.environ.get("ANALYTICS_MAX_STALENESS", 300))  # seconds
+RETRY_INTERVAL = int(os.environ.get("ANALYTICS_RETRY_INTERVAL", 60))  # seconds between attempts
+BACKUP_PAGES_PER_STEP = 1024  # copy in steps so writers can get in between
+
+_refresh_lock = threading.Lock()
+_refreshing = {}  # source -> (started, thread), for this process
+
+
+def snapshot_path(source=DB_NAME):
+    """Returns the snapshot file that belongs to a live database file."""
+    root, ext = os.path.splitext(source)
+    return f"{root}_analytics{ext or '.db'}"
+
+
+def snapshot_age(source=DB_NAME):
+    """Seconds since the snapshot was last refreshed, or None if there is none."""
+    try:
+        return time.time() - os.path.getmtime(snapshot_path(source))
+    except OSError:
+        return None
+
+
+def refresh_snapshot(source=DB_NAME):
+    """Copies the live database into the snapshot file and stamps the copy time."""
+    dest = snapshot_path(source)
+    tmp_path = f"{dest}.{os.getpid()}.tmp"
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+        dst.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (taken_at TEXT NOT NULL)")
+        dst.execute("DELETE FROM snapshot_meta")
+        dst.execute("INSERT INTO snapshot_meta (taken_at) VALUES (?)", (datetime.utcnow().isoformat(),))
+        dst.commit()
+    finally:
+        dst.close()
+        src.close()
+
+    # Swap the new copy in atomically; readers keep their old file handle.
+    try:
+        os.replace(tmp_path, dest)
+    except PermissionError:
+        # Windows refuses to replace a file that is open; keep the old snapshot.
+        os.remove(tmp_path)
+        raise
+    return dest
+
+
+def _refresh_once(source):
+    # One copy at a time across workers; if another worker is copying, its result will do
+    with open(f"{snapshot_path(source)}.lock", "a+b") as lock_file:
+        if not file_locks.lock(lock_file, blocking=False):
+            return
+        try:
+            refresh_snapshot(source)
+        except Exception as e:  # readers keep the old copy
+            print(f"⚠️ Analytics snapshot refresh failed: {e}")
+        finally:
+            file_locks.unlock(lock_file)
+
+
+def ensure_fresh(source=DB_NAME, max_staleness=None, wait=False):
+    """Starts a refresh if the snapshot is older than the staleness bound.
+
+    Returns at once, and the caller reads the current copy. It waits only when
+    there is no snapshot yet, or with wait=True (offline jobs that need
+    current data).
+    """
+    if max_staleness is None:
+        max_staleness = MAX_STALENESS
+    age = snapshot_age(source)
+    if age is not None and age <= max_staleness:
+        return
+    if age is None or wait:
+        with _refresh_lock:
+            age = snapshot_age(source)  # another thread may have refreshed it
+            if age is None or age > max_staleness:
+                try:
+                    refresh_snapshot(source)
+                except PermissionError:
+                    if age is None:
+                        raise
+                    print("⚠️ Analytics snapshot is in use, reading the previous copy")
+        return
+    with _refresh_lock:
+        started, thread = _refreshing.get(source, (None, None))
+        if thread is not None and (thread.is_alive() or time.monotonic() - started < RETRY_INTERVAL):
+            return  # refreshing now, or tried (and maybe failed) a moment ago
+        thread = threading.Thread(target=_refresh_once, args=(source,), name="snapshot-refresh", daemon=True)
+        _refreshing[source] = (time.monotonic(), thread)
+        thread.start()
+
+
+def get_snapshot_connection(source=DB_NAME, max_staleness=None, wait=False):
+    """Opens a read-only connection to the snapshot, refreshing it as ensure_fresh() does."""
+    ensure_fresh(source, max_staleness, wait)
+    uri = f"file:{snapshot_path(source)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def snapshot_taken_at(source=DB_NAME):
+    """Returns the ISO timestamp the current snapshot was copied at, or None."""
+    if snapshot_age(source) is None:
+        return None
+    conn = sqlite3.connect(f"file:{snapshot_path(source)}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT taken_at FROM snapshot_meta").fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+if __name__ == "__main__":
+    print("Refreshing analytics snapshot of", os.path.abspath(DB_NAME))
+    print("✅ Written to", refresh_snapshot())
@@ -0,0 +1,147 @@
+/* minicharts.js — tiny dependency-free SVG charts for the admin dashboard.
+ *
+ * Renders the JSON specs returned by /admin/charts/data.json (see charts.chart_series):
+ *   {kind: "bar"|"pie"|"line"|"stacked", title, labels, values | series, color?, xlabel?, ylabel?}
+ * Charts scale with their container through the SVG viewBox, so the same data
+ * looks right on any screen size.
+ */
+(function (global) {
+    "use strict";
+
+    var SVG_NS = "http://www.w3.org/2000/svg";
+    var W = 480, H = 300, PAD = { top: 28, right: 12, bottom: 70, left: 40 };
+    var PALETTE = ["#0a66ff", "#28a745", "#ffc107", "#dc3545", "#6f42c1", "#17a2b8",
+                   "#fd7e14", "#20c997", "#6c757d", "#e83e8c"];
+
+    function el(name, attrs, text) {
+        var node = document.createElementNS(SVG_NS, name);
+        for (var k in attrs) { node.setAttribute(k, attrs[k]); }
+        if (text !== undefined) { node.textContent = text; }
+        return node;
+    }
+
+    function frame(spec) {
+        var svg = el("svg", { viewBox: "0 0 " + W + " " + H, width: "100%", role: "img",
+                              "aria-label": spec.title, "font-family": "sans-serif", "font-size": 10 });
+        svg.appendChild(el("text", { x: W / 2, y: 16, "text-anchor": "middle", "font-size": 13,
+                                     "font-weight": "bold" }, spec.title));
+        return svg;
+    }
+
+    function axes(svg, spec, labels, max) {
+        var plotH = H - PAD.top - PAD.bottom, plotW = W - PAD.left - PAD.right;
+        svg.appendChild(el("line", { x1: PAD.left, y1: PAD.top, x2: PAD.left, y2: PAD.top + plotH, stroke: "#333" }));
+        svg.appendChild(el("line", { x1: PAD.left, y1: PAD.top + plotH, x2: PAD.left + plotW,
+                                     y2: PAD.top + plotH, stroke: "#333" }));
+        for (var t = 0; t <= 4; t++) {
+            var v = Math.round(max * t / 4), y = PAD.top + plotH - plotH * t / 4;
+            svg.appendChild(el("text", { x: PAD.left - 4, y: y + 3, "text-anchor": "end" }, v));
+        }
+        var step = plotW / Math.max(labels.length, 1);
+        labels.forEach(function (label, i) {
+            var x = PAD.left + step * (i + 0.5), y = PAD.top + plotH + 6;
+            svg.appendChild(el("text", { x: x, y: y, "text-anchor": "end",
+                                         transform: "rotate(-45 " + x + " " + y + ")" },
+                               String(label).slice(0, 18)));
+        });
+        if (spec.ylabel) {
+            svg.appendChild(el("text", { x: 10, y: PAD.top + plotH / 2, "text-anchor": "middle",
+                                         transform: "rotate(-90 10 " + (PAD.top + plotH / 2) + ")" }, spec.ylabel));
+        }
+        return { plotH: plotH, step: step };
+    }
+
+    function bars(svg, spec, series) {
+        var labels = spec.labels, totals = labels.map(function (_, i) {
+            return series.reduce(function (s, ser) { return s + ser.values[i]; }, 0);
+        });
+        var max = Math.max.apply(null, totals.concat([1]));
+        var a = axes(svg, spec, labels, max), base = labels.map(function () { return 0; });
+        series.forEach(function (ser) {
+            ser.values.forEach(function (v, i) {
+                var h = a.plotH * v / max, y = PAD.top + a.plotH - a.plotH * base[i] / max - h;
+                var rect = el("rect", { x: PAD.left + a.step * i + a.step * 0.15, y: y, width: a.step * 0.7,
+                                        height: h, fill: ser.color, stroke: "#222", "stroke-width": 0.5 });
+                rect.appendChild(el("title", {}, labels[i] + (ser.name ? " / " + ser.name : "") + ": " + v));
+                svg.appendChild(rect);
+                base[i] += v;
+            });
+        });
+        if (series.length > 1) { legend(svg, series.map(function (s) { return s.name; }),
+                                        series.map(function (s) { return s.color; })); }
+    }
+
+    function legend(svg, names, colors) {
+        names.forEach(function (name, i) {
+            var y = PAD.top + 12 * i;
+            svg.appendChild(el("rect", { x: W - 100, y: y, width: 8, height: 8, fill: colors[i] }));
+            svg.appendChild(el("text", { x: W - 88, y: y + 8 }, name));
+        });
+    }
+
+    function line(svg, spec) {
+        var max = Math.max.apply(null, spec.values.concat([1]));
+        var a = axes(svg, spec, spec.labels, max);
+        var pts = spec.values.map(function (v, i) {
+            return [PAD.left + a.step * (i + 0.5), PAD.top + a.plotH - a.plotH * v / max];
+        });
+        svg.appendChild(el("polyline", { points: pts.map(function (p) { return p.join(","); }).join(" "),
+                                         fill: "none", stroke: PALETTE[0], "stroke-width": 2 }));
+        pts.forEach(function (p, i) {
+            var dot = el("circle", { cx: p[0], cy: p[1], r: 3, fill: PALETTE[0] });
+            dot.appendChild(el("title", {}, spec.labels[i] + ": " + spec.values[i]));
+            svg.appendChild(dot);
+        });
+    }
+
+    function pie(svg, spec) {
+        var total = spec.values.reduce(function (s, v) { return s + v; }, 0) || 1;
+        var cx = W / 2 - 60, cy = H / 2 + 8, r = 110, angle = -Math.PI / 2;
+        spec.values.forEach(function (v, i) {
+            var next = angle + 2 * Math.PI * v / total, large = next - angle > Math.PI ? 1 : 0;
+            var d = v === total
+                ? "M " + (cx - r) + " " + cy + " a " + r + " " + r + " 0 1 0 " + 2 * r + " 0 a " + r + " " + r + " 0 1 0 " + (-2 * r) + " 0"
+                : "M " + cx + " " + cy + " L " + (cx + r * Math.cos(angle)) + " " + (cy + r * Math.sin(angle)) +
+                  " A " + r + " " + r + " 0 " + large + " 1 " + (cx + r * Math.cos(next)) + " " + (cy + r * Math.sin(next)) + " Z";
+            var slice = el("path", { d: d, fill: PALETTE[i % PALETTE.length], stroke: "#fff" });
+            slice.appendChild(el("title", {}, spec.labels[i] + ": " + v + " (" + (100 * v / total).toFixed(1) + "%)"));
+            svg.appendChild(slice);
+            angle = next;
+        });
+        legend(svg, spec.labels.map(function (l, i) { return l + " (" + (100 * spec.values[i] / total).toFixed(1) + "%)"; }),
+               spec.labels.map(function (_, i) { return PALETTE[i % PALETTE.length]; }));
+    }
+
+    function render(container, spec) {
+        var svg = frame(spec);
+        if (spec.kind === "bar") {
+            bars(svg, spec, [{ values: spec.values, color: spec.color || PALETTE[0] }]);
+        } else if (spec.kind === "stacked") {
+            bars(svg, spec, Object.keys(spec.series).map(function (name, i) {
+                return { name: name, values: spec.series[name], color: PALETTE[i % PALETTE.length] };
+            }));
+        } else if (spec.kind === "line") {
+            line(svg, spec);
+        } else if (spec.kind === "pie") {
+            pie(svg, spec);
+        }
+        container.innerHTML = "";
+        container.appendChild(svg);
+    }
+
+    /* Fetches the chart JSON once and fills every [data-chart] placeholder. */
+    function renderAll(url) {
+        var nodes = document.querySelectorAll("[data-chart]");
+        return fetch(url, { credentials: "same-origin" })
+            .then(function (r) { return r.json(); })
+            .then(function (data) {
+                nodes.forEach(function (node) {
+                    var spec = data.charts[node.getAttribute("data-chart")];
+                    if (spec) { render(node, spec); }
+                    else { node.innerHTML = '<div class="chart-fallback">No data available</div>'; }
+                });
+            });
+    }
+
+    global.MiniCharts = { render: render, renderAll: renderAll };
+})(window);
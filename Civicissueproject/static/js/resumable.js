@@ -0,0 +1,122 @@
+/* resumable.js — chunked, resumable uploads against /uploads/resumable (see resumable.py).
+ *
+ *   ResumableUpload.upload(file, { complaintId: 12, kind: "proof" | "voice",
+ *                                  onProgress: function (sent, total) {} })
+ *
+ * The upload id is remembered in localStorage per complaint + file, so after a
+ * dropped connection or a page reload the same file continues from the offset
+ * the server reports instead of starting over. Each chunk carries a SHA-256
+ * checksum when the browser can compute one (secure contexts).
+ */
+(function (global) {
+    "use strict";
+
+    var CHUNK_SIZE = 2 * 1024 * 1024;  // small enough to finish on a weak mobile link
+    var MAX_RETRIES = 8;
+
+    function storageKey(file, opts) {
+        return ["resumable", opts.complaintId, opts.kind, file.name, file.size, file.lastModified].join(":");
+    }
+
+    function sleep(ms) { return new Promise(function (r) { setTimeout(r, ms); }); }
+
+    function toBase64(buffer) {
+        var bytes = new Uint8Array(buffer), s = "";
+        for (var i = 0; i < bytes.length; i++) { s += String.fromCharCode(bytes[i]); }
+        return btoa(s);
+    }
+
+    function checksum(blob) {
+        if (!global.crypto || !global.crypto.subtle) { return Promise.resolve(null); }
+        return blob.arrayBuffer()
+            .then(function (buf) { return global.crypto.subtle.digest("SHA-256", buf); })
+            .then(function (digest) { return "sha256 " + toBase64(digest); });
+    }
+
+    function create(file, opts) {
+        return fetch("/uploads/resumable", {
+            method: "POST", credentials: "same-origin",
+            headers: { "Content-Type": "application/json", "Accept": "application/json" },
+            body: JSON.stringify({ complaint_id: opts.complaintId, kind: opts.kind,
+                                   filename: file.name, length: file.size })
+        }).then(function (r) {
+            return r.json().then(function (data) {
+                if (!r.ok) { throw new Error(data.error || ("Upload refused (" + r.status + ")")); }
+                return data.upload_id;
+            });
+        });
+    }
+
+    /* Offset the server already has, or null if the upload is unknown (expired/finished). */
+    function serverOffset(uploadId) {
+        return fetch("/uploads/resumable/" + uploadId, { method: "HEAD", credentials: "same-origin" })
+            .then(function (r) { return r.ok ? parseInt(r.headers.get("Upload-Offset"), 10) : null; });
+    }
+
+    function sendChunk(uploadId, blob, offset) {
+        return checksum(blob).then(function (sum) {
+            var headers = { "Content-Type": "application/offset+octet-stream", "Upload-Offset": String(offset) };
+            if (sum) { headers["Upload-Checksum"] = sum; }
+            return fetch("/uploads/resumable/" + uploadId, {
+                method: "PATCH", credentials: "same-origin", headers: headers, body: blob
+            });
+        }).then(function (r) {
+            if (r.status === 204) { return parseInt(r.headers.get("Upload-Offset"), 10); }
+            if (r.status === 409 || r.status === 423 || r.status === 460) { return null; }  // re-sync and retry
+            return r.json().then(function (data) { throw new Error(data.error || ("Upload failed (" + r.status + ")")); });
+        });
+    }
+
+    function upload(file, opts) {
+        var key = storageKey(file, opts);
+        var onProgress = opts.onProgress || function () {};
+        var uploadId = localStorage.getItem(key);
+
+        var start = uploadId
+            ? serverOffset(uploadId).then(function (offset) {
+                  if (offset !== null) { return offset; }
+                  uploadId = null;
+                  return 0;
+              })
+            : Promise.resolve(0);
+
+        return start.then(function (offset) {
+            if (uploadId) { return offset; }
+            return create(file, opts).then(function (id) {
+                uploadId = id;
+                localStorage.setItem(key, id);
+                return 0;
+            });
+        }).then(function loop(offset, retries) {
+            // Where to continue after a failed/refused chunk. A finished upload is no longer
+            // known to the server, which after the last chunk means it went through.
+            function resync() {
+                return serverOffset(uploadId).then(function (o) {
+                    if (o !== null) { return o; }
+                    if (offset + CHUNK_SIZE >= file.size) { return file.size; }
+                    throw new Error("The upload expired on the server, please try again.");
+                });
+            }
+            retries = retries || 0;
+            onProgress(offset, file.size);
+            if (offset >= file.size) {
+                localStorage.removeItem(key);
+                return uploadId;
+            }
+            return sendChunk(uploadId, file.slice(offset, offset + CHUNK_SIZE), offset)
+                .then(function (next) {
+                    if (next !== null) { return loop(next, 0); }
+                    if (retries >= MAX_RETRIES) { throw new Error("The upload keeps failing, please try again."); }
+                    return resync().then(function (o) { return loop(o, retries + 1); });
+                }, function (err) {
+                    if (retries >= MAX_RETRIES || !(err instanceof TypeError)) { throw err; }
+                    // Network error: back off, ask the server where we are, carry on
+                    return sleep(Math.min(30000, 1000 * Math.pow(2, retries)))
+                        .then(resync)
+                        .then(function (o) { return loop(o, retries + 1); });
+                });
+        });
+    }
+
+    global.ResumableUpload = { upload: upload, CHUNK_SIZE: CHUNK_SIZE };
+})(window);
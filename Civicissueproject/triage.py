@@ -0,0 +1,363 @@
+# triage.py
+# Suggests the right department for a complaint from its text.
+#
+# Citizens often pick the wrong department and admins reassign by hand. This
+# is a small offline classifier trained on past complaint/department pairs
+# (including reassignments, since those update the department column):
+#
+#   features  word unigrams + bigrams, hashed (crc32) into N_FEATURES
+#             buckets, sublinear TF x IDF, L2-normalised
+#   model     multinomial logistic regression, trained by full-batch
+#             gradient descent on the sparse matrix
+#
+# It is plain NumPy (like duplicates.py), so there is nothing to install and
+# one classification costs one sparse-row x dense-matrix product.
+#
+# New and edited complaints are put on an in-process queue. A background
+# thread scores them in micro-batches (up to BATCH_SIZE, or whatever arrives
+# within BATCH_WAIT seconds) and stores the suggestion and its confidence in
+# triage_suggestions. Submitting a complaint never waits for the model.
+#
+#   python triage.py --train      # retrain from civic.db, then rescore every complaint
+#   python triage.py --backfill   # score complaints that have no suggestion yet
+#   python triage.py --bench      # classifications per second on one core
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from database import DB_NAME, get_db_connection
+
+# --- Config ---
+N_FEATURES = 2 ** 18
+EPOCHS = 300
+LEARNING_RATE = 2.0
+L2 = 1e-4
+MIN_TRAINING_ROWS = 10
+SUGGEST_MIN_CONFIDENCE = float(os.environ.get("TRIAGE_MIN_CONFIDENCE", 0.6))  # below this, don't show it
+BATCH_SIZE = 64
+BATCH_WAIT = 0.05  # seconds to wait for more complaints before scoring a batch
+
+_TOKEN_RE = re.compile(r"\w+")
+_model = None             # (mtime, model dict) of the loaded model file
+_model_lock = threading.Lock()
+_queue = queue.Queue()
+_worker = None            # (pid, thread)
+
+
+def create_tables(conn):
+    """Creates the suggestions table (called from init_db)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS triage_suggestions (
+                     complaint_id INTEGER PRIMARY KEY, department TEXT NOT NULL,
+                     confidence REAL NOT NULL, model_version TEXT NOT NULL, scored_at TEXT NOT NULL
+                 )''')
+
+
+def model_path():
+    root, _ = os.path.splitext(DB_NAME)
+    return f"{root}_triage.npz"
+
+
+# -------------------------
+# Features
+# -------------------------
+def _feature_ids(text):
+    words = _TOKEN_RE.findall((text or "").lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(g.encode()) % N_FEATURES for g in grams]
+
+
+def vectorize(texts, idf=None):
+    """Sparse rows as (indptr, cols, vals): sublinear TF (x IDF), L2-normalised."""
+    import numpy as np
+
+    indptr, cols, counts = [0], [], []
+    for text in texts:
+        ids, n = np.unique(np.asarray(_feature_ids(text), dtype=np.int64), return_counts=True)
+        cols.append(ids)
+        counts.append(n)
+        indptr.append(indptr[-1] + len(ids))
+    indptr = np.asarray(indptr)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    vals = 1 + np.log(np.concatenate(counts).astype(np.float32)) if counts else np.zeros(0, np.float32)
+    if idf is not None:
+        vals *= idf[cols]
+    lengths = np.diff(indptr)
+    norms = np.ones(len(lengths), dtype=np.float32)
+    nonempty = lengths > 0
+    if nonempty.any():
+        norms[nonempty] = np.sqrt(np.add.reduceat(vals ** 2, indptr[:-1][nonempty]))
+    vals /= np.repeat(norms, lengths)
+    return indptr, cols, vals.astype(np.float32)
+
+
+def _scores(X, W, b):
+    import numpy as np
+
+    indptr, cols, vals = X
+    n = len(indptr) - 1
+    scores = np.tile(b, (n, 1))
+    nonempty = np.diff(indptr) > 0
+    if nonempty.any():
+        contrib = vals[:, None] * W[cols]
+        scores[nonempty] += np.add.reduceat(contrib, indptr[:-1][nonempty], axis=0)
+    return scores
+
+
+def _softmax(scores):
+    import numpy as np
+
+    e = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+# -------------------------
+# Training
+# -------------------------
+def fit(texts, labels, epochs=EPOCHS):
+    """Trains on parallel lists of texts and department names. Returns a model dict."""
+    import numpy as np
+
+    classes = sorted(set(labels))
+    y = np.searchsorted(classes, labels)
+    n, k = len(texts), len(classes)
+
+    indptr, cols, _ = vectorize(texts)
+    df = np.bincount(cols, minlength=N_FEATURES)
+    idf_default = np.log(1 + n) + 1  # features never seen in training
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    indptr, cols, vals = vectorize(texts, idf)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    # Train on the features that actually occur, not all N_FEATURES buckets
+    used, compact = np.unique(cols, return_inverse=True)
+    X = (indptr, compact, vals)
+
+    W = np.zeros((len(used), k), dtype=np.float32)
+    b = np.zeros(k, dtype=np.float32)
+    Y = np.eye(k, dtype=np.float32)[y]
+    for _ in range(epochs):
+        G = (_softmax(_scores(X, W, b)) - Y) / n          # d loss / d scores
+        for j in range(k):
+            W[:, j] -= LEARNING_RATE * (np.bincount(compact, weights=vals * G[rows, j], minlength=len(used))
+                                        + L2 * W[:, j])
+        b -= LEARNING_RATE * G.sum(axis=0)
+
+    full = np.zeros((N_FEATURES, k), dtype=np.float32)
+    full[used] = W
+    return {"classes": np.asarray(classes), "idf": idf, "idf_default": idf_default, "used": used,
+            "W": full, "b": b, "version": datetime.utcnow().strftime("%Y%m%dT%H%M%S")}
+
+
+def save_model(model, path=None):
+    import numpy as np
+
+    path = path or model_path()
+    used = model["used"]  # only these rows of W / idf carry information
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, classes=model["classes"], used=used, idf=model["idf"][used],
+                        idf_default=model["idf_default"], W=model["W"][used], b=model["b"],
+                        version=model["version"])
+    os.replace(tmp, path)
+
+
+def load_model(path=None):
+    """The trained model, reloaded when the file changes (e.g. after --train); None if untrained."""
+    global _model
+    import numpy as np
+
+    path = path or model_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _model_lock:
+        if _model is None or _model[0] != mtime:
+            with np.load(path) as data:
+                used = data["used"]
+                W = np.zeros((N_FEATURES, len(data["classes"])), dtype=np.float32)
+                W[used] = data["W"]
+                idf = np.full(N_FEATURES, data["idf_default"], dtype=np.float32)
+                idf[used] = data["idf"]
+                _model = (mtime, {"classes": data["classes"], "idf": idf, "W": W, "b": data["b"],
+                                  "version": str(data["version"])})
+        return _model[1]
+
+
+def classify(texts, model=None):
+    """[(department, confidence)] for each text."""
+    model = model or load_model()
+    if model is None:
+        return [(None, 0.0)] * len(texts)
+    probs = _softmax(_scores(vectorize(texts, model["idf"]), model["W"], model["b"]))
+    best = probs.argmax(axis=1)
+    return [(str(model["classes"][i]), round(float(p[i]), 4)) for i, p in zip(best, probs)]
+
+
+def training_data():
+    """(texts, departments) of every complaint with both, archived ones included."""
+    from archive import complaints_source
+    from snapshot import get_snapshot_connection
+
+    conn = get_snapshot_connection(max_staleness=0, wait=True)
+    try:
+        rows = conn.execute(f"""SELECT complaint, department FROM {complaints_source(conn, True)}
+                                WHERE trim(COALESCE(complaint, '')) != ''
+                                      AND trim(COALESCE(department, '')) != ''""").fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows], [r[1].strip() for r in rows]
+
+
+def train():
+    """Retrains from the database and saves the model. Returns (model, rows) or (None, rows)."""
+    texts, labels = training_data()
+    if len(texts) < MIN_TRAINING_ROWS or len(set(labels)) < 2:
+        return None, len(texts)
+    model = fit(texts, labels)
+    save_model(model)
+    return model, len(texts)
+
+
+# -------------------------
+# Scoring queue
+# -------------------------
+def store(conn, scored, version):
+    """Saves [(cid, department, confidence)] on the caller's connection."""
+    now = datetime.utcnow().isoformat()
+    conn.executemany("INSERT OR REPLACE INTO triage_suggestions VALUES (?, ?, ?, ?, ?)",
+                     [(cid, dept, conf, version, now) for cid, dept, conf in scored])
+
+
+def score_batch(batch):
+    """Classifies [(cid, text)] in one pass and stores the suggestions."""
+    model = load_model()
+    if model is None or not batch:
+        return 0
+    results = classify([text for _, text in batch], model)
+    conn = get_db_connection()
+    try:
+        store(conn, [(cid, dept, conf) for (cid, _), (dept, conf) in zip(batch, results)], model["version"])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(batch)
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT
+        while len(batch) < BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            score_batch(batch)
+        except Exception as e:  # a bad batch must not kill the worker thread
+            print(f"⚠️ Triage failed for complaints {[cid for cid, _ in batch]}: {e}")
+
+
+def enqueue(cid, text):
+    """Queues a new or edited complaint for scoring; returns at once."""
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():  # first use, or a forked worker
+        thread = threading.Thread(target=_run, name="triage", daemon=True)
+        thread.start()
+        _worker = (os.getpid(), thread)
+    _queue.put((cid, text))
+
+
+def get_suggestion(cid):
+    """{department, confidence, model_version} for a complaint, or None."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT department, confidence, model_version FROM triage_suggestions "
+                       "WHERE complaint_id = ?", (cid,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def backfill(rescore=False, batch_size=500):
+    """Scores complaints without a suggestion (every complaint with rescore). Returns complaints scored."""
+    model = load_model()
+    if model is None:
+        return 0
+    conn = get_db_connection()
+    where = "" if rescore else "WHERE id NOT IN (SELECT complaint_id FROM triage_suggestions)"
+    rows = conn.execute(f"SELECT id, complaint FROM complaints {where} ORDER BY id").fetchall()
+    for i in range(0, len(rows), batch_size):
+        chunk = rows[i:i + batch_size]
+        results = classify([r["complaint"] for r in chunk], model)
+        store(conn, [(r["id"], dept, conf) for r, (dept, conf) in zip(chunk, results)], model["version"])
+        conn.commit()
+    conn.close()
+    return len(rows)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+BENCH_VOCAB = {
+    "Water Supply": "water pipe leak tap supply tank dirty drinking borewell pressure",
+    "Electricity": "power cut electricity transformer pole wire voltage meter outage streetlight",
+    "Roads & Transport": "road pothole bus traffic bridge repair footpath signal highway",
+    "Health & Sanitation": "garbage drain sewage mosquito hospital waste toilet smell clinic",
+    "Education": "school teacher classroom books midday meal students building fees",
+    "Other": "noise stray animals park encroachment tree market shop permit",
+}
+
+
+def _synthetic(n, rng):
+    filler = "the near our village since last week please help no one came yet".split()
+    depts = list(BENCH_VOCAB)
+    labels = [depts[i] for i in rng.integers(0, len(depts), n)]
+    texts = [" ".join(rng.permutation(BENCH_VOCAB[d].split()[:rng.integers(2, 6)] + filler[:rng.integers(4, 12)]))
+             for d in labels]
+    return texts, labels
+
+
+def benchmark(train_rows=5000, rounds=3):
+    """Prints training time and classifications per second on one core, per batch size."""
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    texts, labels = _synthetic(train_rows, rng)
+    start = time.perf_counter()
+    model = fit(texts, labels)
+    print(f"trained on {train_rows} synthetic complaints in {time.perf_counter() - start:.1f} s")
+
+    test_texts, test_labels = _synthetic(4096, rng)
+    accuracy = np.mean([d == l for (d, _), l in zip(classify(test_texts, model), test_labels)])
+    print(f"held-out accuracy {accuracy:.1%}")
+    for batch in (1, 16, BATCH_SIZE, 512):
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for i in range(0, len(test_texts), batch):
+                classify(test_texts[i:i + batch], model)
+            best = min(best, time.perf_counter() - start)
+        print(f"batch {batch:>4}: {len(test_texts) / best:9.0f} complaints/s")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--train" in sys.argv:
+        model, rows = train()
+        if model is None:
+            print(f"⚠️ Not enough labelled complaints to train ({rows}, need {MIN_TRAINING_ROWS} "
+                  f"across at least 2 departments)")
+        else:
+            print(f"✅ Trained on {rows} complaints ({len(model['classes'])} departments) -> {model_path()}")
+            print(f"✅ {backfill(rescore=True)} complaints rescored")
+    elif "--backfill" in sys.argv:
+        print(f"✅ {backfill()} complaints scored")
+    elif "--bench" in sys.argv:
+        benchmark()
+    else:
+        print("Usage: python triage.py --train | --backfill | --bench")
@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from flask import Blueprint, abort, render_template, request, flash, redirect, url_for, session, jsonify, make_response
 from werkzeug.utils import secure_filename
 import os
+import posixpath
 # Import from the new database.py file
-from database import get_complaint_by_id, update_complaint_proof, UPLOAD_FOLDER
+from database import get_complaint_by_id, get_db_connection, update_complaint_proof, UPLOAD_FOLDER
+from delivery import send_media
+import resumable
 
 upload_bp = Blueprint('uploads', __name__)
 
@@ -34,3 +37,96 @@ def upload_proof_page(cid):
 
     return render_template('upload_proof.html', complaint=complaint)
 
+
+
+@upload_bp.route('/media/uploads/<path:filename>')
+def media(filename):
+    """Serves a proof or voice file to an admin or to the citizen who uploaded it."""
+    if session.get("role") != "admin":
+        if "user" not in session:
+            return "Authentication required", 401
+        from archive import complaints_source
+        conn = get_db_connection()
+        owned = conn.execute(f"""SELECT 1 FROM {complaints_source(conn, True)}
+                                 WHERE user_phone = ? AND (proof = ? OR voice_proof = ?) LIMIT 1""",
+                             (session["user"], filename, filename)).fetchone()
+        conn.close()
+        if not owned:
+            return "Forbidden", 403
+    return send_media("uploads", UPLOAD_FOLDER, filename)
+
+
+@upload_bp.before_app_request
+def block_static_uploads():
+    """Uploads live under static/, but only media() may serve them: 404 on /static/uploads/..."""
+    if request.endpoint == "static":
+        # normpath folds "a/../uploads/x" and "./uploads/x"; lower() for case-insensitive disks
+        path = posixpath.normpath((request.view_args or {}).get("filename", "")).lower()
+        if path == "uploads" or path.startswith("uploads/"):
+            abort(404)
+
+
+# --- Resumable uploads (protocol in resumable.py, client in static/js/resumable.js) ---
+def _upload_error(error):
+    status, message = error
+    return jsonify({'success': False, 'error': message}), status
+
+
+def _owned_upload(upload_id):
+    meta = resumable.get(upload_id)
+    if not meta or meta['user'] != session.get('user'):
+        return None
+    return meta
+
+
+@upload_bp.route('/uploads/resumable', methods=['POST'])
+def resumable_create():
+    if "user" not in session:
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+    data = request.get_json(silent=True) or {}
+    complaint = get_complaint_by_id(data.get('complaint_id'))
+    if not complaint or complaint['user_phone'] != session['user']:
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    meta, error = resumable.create(session['user'], complaint['id'], data.get('kind'),
+                                   data.get('filename'), data.get('length'))
+    if error:
+        return _upload_error(error)
+    response = jsonify({'success': True, 'upload_id': meta['id'], 'offset': 0,
+                        'max_chunk': resumable.MAX_CHUNK_BYTES})
+    response.status_code = 201
+    response.headers['Location'] = url_for('uploads.resumable_upload', upload_id=meta['id'])
+    response.headers['Upload-Offset'] = '0'
+    return response
+
+
+@upload_bp.route('/uploads/resumable/<upload_id>', methods=['HEAD', 'PATCH', 'DELETE'])
+def resumable_upload(upload_id):
+    meta = _owned_upload(upload_id)
+    if meta is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+
+    if request.method == 'HEAD':
+        response = make_response('', 200)
+        response.headers['Upload-Offset'] = str(resumable.offset(upload_id))
+        response.headers['Upload-Length'] = str(meta['length'])
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    if request.method == 'DELETE':
+        resumable.discard(upload_id)
+        return '', 204
+
+    if request.mimetype != 'application/offset+octet-stream':
+        return jsonify({'success': False, 'error': 'Content-Type must be application/offset+octet-stream'}), 415
+    try:
+        at_offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'Upload-Offset header is required'}), 400
+    new_offset, error = resumable.append(meta, at_offset, request.stream, request.content_length,
+                                         request.headers.get('Upload-Checksum'))
+    if error:
+        return _upload_error(error)
+    response = make_response('', 204)
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
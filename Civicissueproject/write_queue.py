@@ -0,0 +1,245 @@
+# write_queue.py
+# Group commit for the citizen-facing writes (complaints from the form and the
+# chatbot, feedback).
+#
+# Each of those used to open a connection, insert a row and commit on its
+# own, so every submission paid for a full journal sync and queued for
+# SQLite's single write lock. Now a request hands its write to submit() as a
+# function of a connection. One writer thread per process collects whatever
+# arrives within GROUP_WAIT seconds (up to GROUP_MAX writes) and runs it as a
+# single transaction: one lock, one sync. submit() returns the function's
+# result (usually the new row id) once that transaction has committed, so a
+# caller never sees an id that isn't on disk.
+#
+# Every write runs in its own SAVEPOINT: one that raises is rolled back alone,
+# the others still commit, and the exception is re-raised in its caller.
+# When more than QUEUE_MAX writes are already waiting, submit() writes
+# directly on its own connection instead, as before. It does the same when
+# the writer hasn't picked its write up within SUBMIT_TIMEOUT seconds (a
+# stalled or dead writer): the queued write is cancelled first, so it never
+# runs twice. A writer that dies fails the writes it holds. Its replacement
+# takes over the ones still queued.
+#
+# Grouping needs several requests in flight in the same process. The Procfile
+# therefore runs gunicorn with gthread workers (--worker-class gthread
+# --threads 8). With the default sync workers each process serves one request
+# at a time, every group holds a single write, and the queue only adds
+# GROUP_WAIT to it. Run sync workers with WRITE_QUEUE=0.
+#
+#   python write_queue.py --bench     # commits/s and submit latency, direct vs grouped
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from database import get_db_connection
+
+# --- Config ---
+ENABLED = os.environ.get("WRITE_QUEUE", "1") == "1"
+GROUP_WAIT = float(os.environ.get("WRITE_GROUP_WAIT_MS", 2)) / 1000  # seconds to gather a group
+GROUP_MAX = int(os.environ.get("WRITE_GROUP_MAX", 64))
+QUEUE_MAX = int(os.environ.get("WRITE_QUEUE_MAX", 256))  # beyond this, callers write directly
+SUBMIT_TIMEOUT = float(os.environ.get("WRITE_SUBMIT_TIMEOUT", 10))  # seconds; above SQLite's 5 s busy wait
+
+_writer = None  # (pid, queue, thread)
+_writer_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"grouped": 0, "groups": 0, "direct": 0, "largest_group": 0, "timeouts": 0}
+
+
+def _direct(job):
+    conn = get_db_connection()
+    try:
+        result = job(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    with _stats_lock:
+        _stats["direct"] += 1
+    return result
+
+
+def _commit_group(conn, batch):
+    outcomes = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for job, _ in batch:
+            conn.execute("SAVEPOINT write")
+            try:
+                outcomes.append((job(conn), None))
+                conn.execute("RELEASE write")
+            except Exception as e:
+                conn.execute("ROLLBACK TO write")
+                conn.execute("RELEASE write")
+                outcomes.append((None, e))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    with _stats_lock:
+        _stats["groups"] += 1
+        _stats["grouped"] += len(batch)
+        _stats["largest_group"] = max(_stats["largest_group"], len(batch))
+    for (_, future), (result, error) in zip(batch, outcomes):
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def _run(jobs):
+    conn = None
+    while True:
+        batch = [jobs.get()]
+        deadline = time.monotonic() + GROUP_WAIT
+        while len(batch) < GROUP_MAX:
+            try:
+                # Once the deadline has passed this still takes what is already queued
+                batch.append(jobs.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        # Claim each write; one whose caller timed out and cancelled it is skipped
+        batch = [(job, future) for job, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            continue
+        try:
+            if conn is None:
+                conn = get_db_connection()
+                conn.isolation_level = None  # transactions are managed here
+            _commit_group(conn, batch)
+        except Exception as e:  # nothing committed: every caller gets the error
+            _fail(batch, e)
+            if conn is not None:
+                conn.close()
+                conn = None
+        except BaseException as e:  # the writer is going down: don't leave its callers waiting
+            _fail(batch, e)
+            raise
+
+
+def _fail(batch, error):
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
+
+def _queue():
+    global _writer
+    with _writer_lock:
+        # First use, a forked worker, or a writer that died
+        if _writer is None or _writer[0] != os.getpid() or not _writer[2].is_alive():
+            jobs = queue.Queue()
+            if _writer is not None and _writer[0] == os.getpid():
+                # Hand over what the dead writer left queued; after a fork, the
+                # threads waiting on those writes stayed in the parent
+                while True:
+                    try:
+                        jobs.put(_writer[1].get_nowait())
+                    except queue.Empty:
+                        break
+            thread = threading.Thread(target=_run, args=(jobs,), name="write-queue", daemon=True)
+            thread.start()
+            _writer = (os.getpid(), jobs, thread)
+        return _writer[1]
+
+
+def submit(job):
+    """Runs job(conn) in the next group commit and returns its result once committed.
+
+    `job` runs on the writer thread, so it can't touch the request or session.
+    It writes through `conn` only and never commits; if it raises, only its
+    own writes are undone and the exception is raised here. If the writer
+    hasn't started it within SUBMIT_TIMEOUT, it runs directly instead.
+    """
+    if not ENABLED:
+        return _direct(job)
+    jobs = _queue()
+    if jobs.qsize() >= QUEUE_MAX:
+        return _direct(job)
+    future = Future()
+    jobs.put((job, future))
+    try:
+        return future.result(timeout=SUBMIT_TIMEOUT)
+    except FutureTimeout:
+        if not future.cancel():
+            # The writer is running it: wait once more for the outcome rather
+            # than risk writing it twice; a second timeout reaches the caller
+            return future.result(timeout=SUBMIT_TIMEOUT)
+    with _stats_lock:
+        _stats["timeouts"] += 1
+    return _direct(job)
+
+
+def stats():
+    """This process's group sizes and how many writes bypassed the queue."""
+    with _stats_lock:
+        counts = dict(_stats)
+    return dict(counts, enabled=ENABLED, queued=_writer[1].qsize() if _writer else 0,
+                mean_group=round(counts["grouped"] / counts["groups"], 2) if counts["groups"] else None)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def benchmark(threads=16, per_thread=40):
+    """Prints complaints committed per second and submit latency, direct vs grouped.
+
+    Runs against a throwaway copy of the database. `threads` request threads
+    each submit `per_thread` complaints (complaint row + status history, as
+    submit_complaint does), back to back.
+    """
+    import shutil
+    import statistics
+    import tempfile
+
+    import database
+    import write_queue  # the module callers use, not __main__
+    from database import record_status_change
+
+    tmp = tempfile.mkdtemp()
+    database.DB_NAME = shutil.copy(database.DB_NAME, os.path.join(tmp, "bench.db"))
+    import app  # init_db brings the copy's schema up to date
+
+    def insert(conn):
+        c = conn.execute("INSERT INTO complaints (user_phone, name, district, department, complaint) "
+                         "VALUES ('0000000000', 'Bench', 'Bench', 'Water', 'No water supply since morning')")
+        record_status_change(conn, c.lastrowid, None, "Pending")
+        return c.lastrowid
+
+    def citizen(latencies):
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            write_queue.submit(insert)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    try:
+        for label, enabled in (("direct ", False), ("grouped", True)):
+            write_queue.ENABLED = enabled
+            before = write_queue.stats()
+            latencies = []
+            pool = [threading.Thread(target=citizen, args=(latencies,)) for _ in range(threads)]
+            start = time.perf_counter()
+            for t in pool:
+                t.start()
+            for t in pool:
+                t.join()
+            elapsed = time.perf_counter() - start
+            after = write_queue.stats()
+            commits = after["groups"] - before["groups"] + after["direct"] - before["direct"]
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{label}: {len(latencies) / elapsed:7.0f} complaints/s in {commits / elapsed:6.0f} commits/s, "
+                  f"submit p50 {statistics.median(latencies):6.1f} ms, p99 {p99:6.1f} ms")
+        print(f"   {write_queue.stats()}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+    else:
+        print("Usage: python write_queue.py --bench")